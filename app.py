@@ -18,12 +18,13 @@ screen = pg.display.set_mode(sc_size)
 pg.display.set_caption('Sudoku')
 clock = pg.time.Clock()
 PageManager.init(screen)
-pages.MainMenu()
-pages.SelectDifficulty()
-pages.GamePage()
-pages.SelectSolutionPage()
-pages.SolverPage()
-pages.GeneratorPage()
+PageManager.register('MainMenu', pages.MainMenu)
+PageManager.register('SelectDifficulty', pages.SelectDifficulty)
+PageManager.register('GamePage', pages.GamePage)
+PageManager.register('SelectSolutionPage', pages.SelectSolutionPage)
+PageManager.register('SolverPage', pages.SolverPage)
+PageManager.register('GeneratorPage', pages.GeneratorPage)
+pages.puzzle_pool.start()
 
 
 example2 = [[0,3,0,0,0,0,0,0,0],
@@ -49,4 +50,5 @@ while playing:
 
     pg.display.update()
 
+pages.puzzle_pool.stop()
 pg.quit()
\ No newline at end of file
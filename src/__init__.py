@@ -0,0 +1,46 @@
+"""Nucleo do sudoku (solver, leitura dos jogos, busca e gerador) sem dependencia do
+pygame. Os submodulos so sao importados quando um nome e acessado pela primeira vez:
+
+    import src
+    src.SudokuSolver(src.read_sudoku('facil', 0)).solve()
+
+A interface grafica fica em src.pages e src.pygamepages.
+"""
+import importlib
+
+
+_LAZY_NAMES = {
+    'Sudoku': 'sudoku',
+    'SudokuSolver': 'sudoku',
+    'read_sudoku': 'sudoku',
+    'read_puzzle': 'bank',
+    'GridSearch': 'search',
+    'count_solutions': 'search',
+    'iter_solutions': 'search',
+    'has_unique_solution': 'search',
+    'solve_grid': 'search',
+    'random_full_grid': 'search',
+    'generate': 'generator',
+    'rate': 'generator',
+    'Profiler': 'profiling',
+}
+_SUBMODULES = ['sudoku', 'search', 'generator', 'bank', 'notes', 'branching', 'variants', 'cnf',
+    'fuzz', 'portfolio', 'parallel', 'sampler', 'puzzle_pool', 'profiling', 'server', 'batch',
+    'import_benchmark', 'pages', 'pygamepages']
+
+__all__ = list(_LAZY_NAMES)
+
+
+def __getattr__(name: str):
+    if name in _LAZY_NAMES:
+        value = getattr(importlib.import_module('.' + _LAZY_NAMES[name], __name__), name)
+    elif name in _SUBMODULES:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__ + _SUBMODULES)
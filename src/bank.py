@@ -0,0 +1,206 @@
+"""Bancos de jogos com solucao, avaliacao e dicas pre-calculadas.
+
+Cada jogo do banco (games/<dificuldade>.txt) ocupa 9 linhas seguidas de uma linha
+separadora. A separadora pode trazer os dados calculados offline, que o
+read_sudoku simplesmente ignora:
+
+    ----------------- solution=5346... score=52 difficulty=facil hints=0:4:7:solved-cells,...
+
+As dicas sao as deducoes disponiveis no jogo inicial (celulas com uma unica
+possibilidade e valores unicos em uma unidade), no formato linha:coluna:valor:tecnica.
+Os bancos ficam em memoria depois da primeira leitura, entao consultar a solucao
+ou uma dica e so um acesso a dicionario:
+
+    entry = read_puzzle('facil', 0)
+    entry['solution'], entry['hints']
+    lookup(sudoku.values)  # mesmo jogo em qualquer banco, ou None
+    solution_of(grid)      # do banco ou calculada na hora
+
+    python -m src.bank [dificuldades...]   # recalcula e regrava os bancos
+"""
+from typing import List, Dict, Tuple, Optional, Any, Sequence
+from multiprocessing import Pool
+import random
+import os
+
+from .sudoku import Index, SudokuSolver
+from .search import Grid, GridSearch, solve_grid, to_grid
+from .generator import DIFFICULTIES, rate
+
+
+Hint = Tuple[Index, int, str]
+
+BANK_DIRECTORY = 'games'
+SEPARATOR = '-----------------'
+
+_banks: Dict[str, List[Dict[str, Any]]] = {}
+_index: Dict[str, Dict[str, Any]] = {}
+
+
+def grid_key(grid: Grid) -> str:
+    return ''.join(str(value) for row in grid for value in row)
+
+
+def _parse_grid(text: str, size: int = 9) -> Grid:
+    return [[int(text[size*i + j]) for j in range(size)] for i in range(size)]
+
+
+def _parse_meta(line: str, entry: Dict[str, Any]) -> None:
+    for field in line[len(SEPARATOR):].split():
+        key, _, value = field.partition('=')
+        if key == 'solution':
+            entry['solution'] = _parse_grid(value)
+        elif key == 'score':
+            entry['score'] = int(value)
+        elif key == 'difficulty':
+            entry['difficulty'] = value
+        elif key == 'hints':
+            hints = [hint.split(':') for hint in value.split(',') if hint]
+            entry['hints'] = [((int(i), int(j)), int(v), technique) for i, j, v, technique in hints]
+
+
+def parse_bank(text: str) -> List[Dict[str, Any]]:
+    """Le os jogos de um banco; solution, score e difficulty ficam None e hints
+    vazio quando a linha separadora nao traz os dados"""
+    lines = text.splitlines()
+    entries = []
+    for start in range(0, len(lines) - 8, 10):
+        entry: Dict[str, Any] = {
+            'grid': [list(map(int, line.split())) for line in lines[start:start + 9]],
+            'solution': None,
+            'score': None,
+            'difficulty': None,
+            'hints': [],
+        }
+        if start + 9 < len(lines):
+            _parse_meta(lines[start + 9], entry)
+        entries.append(entry)
+    return entries
+
+
+def format_bank(entries: Sequence[Dict[str, Any]]) -> str:
+    blocks = []
+    for entry in entries:
+        lines = [' '.join(map(str, row)) for row in entry['grid']]
+        meta = [SEPARATOR]
+        if entry.get('solution') is not None:
+            meta.append('solution=' + grid_key(entry['solution']))
+        if entry.get('score') is not None:
+            meta.append(f"score={entry['score']}")
+        if entry.get('difficulty') is not None:
+            meta.append(f"difficulty={entry['difficulty']}")
+        if entry.get('hints'):
+            meta.append('hints=' + ','.join(f'{i}:{j}:{v}:{technique}'
+                    for (i, j), v, technique in entry['hints']))
+        lines.append(' '.join(meta))
+        blocks.append('\n'.join(lines))
+    return '\n'.join(blocks) + '\n'
+
+
+def load_bank(difficulty: str, directory: str = BANK_DIRECTORY) -> List[Dict[str, Any]]:
+    """Retorna os jogos do banco, lidos do disco apenas na primeira chamada"""
+    path = os.path.join(directory, difficulty + '.txt')
+    if not path in _banks:
+        with open(path, 'r') as f:
+            _banks[path] = parse_bank(f.read())
+        for number, entry in enumerate(_banks[path]):
+            entry['bank'], entry['number'] = difficulty, number
+            _index.setdefault(grid_key(entry['grid']), entry)
+    return _banks[path]
+
+
+def clear_cache(path: Optional[str] = None) -> None:
+    """Esquece os bancos lidos (ou so o do arquivo path) e os jogos indexados deles"""
+    if path is None:
+        _banks.clear()
+        _index.clear()
+        return
+    _banks.pop(path, None)
+    _index.clear()
+    for entries in _banks.values():
+        for entry in entries:
+            _index.setdefault(grid_key(entry['grid']), entry)
+
+
+def _copy(entry: Dict[str, Any]) -> Dict[str, Any]:
+    entry = dict(entry)
+    entry['grid'] = [row.copy() for row in entry['grid']]
+    if entry['solution'] is not None:
+        entry['solution'] = [row.copy() for row in entry['solution']]
+    entry['hints'] = list(entry['hints'])
+    return entry
+
+
+def read_puzzle(difficulty: Optional[str] = None, number: Optional[int] = None) -> Dict[str, Any]:
+    """Como read_sudoku, mas retorna o jogo junto da solucao, avaliacao e dicas"""
+    if difficulty is None:
+        difficulty = random.choice(DIFFICULTIES)
+    bank = load_bank(difficulty)
+    if number is None:
+        number = random.randrange(len(bank))
+    return _copy(bank[number])
+
+
+def lookup(grid: Grid) -> Optional[Dict[str, Any]]:
+    """Procura o jogo inicial em todos os bancos"""
+    for difficulty in DIFFICULTIES:
+        load_bank(difficulty)
+    entry = _index.get(grid_key(grid))
+    return None if entry is None else _copy(entry)
+
+
+def solution_of(grid: Grid) -> Optional[Grid]:
+    """Solucao unica do jogo: lida do banco quando o jogo esta em algum banco,
+    calculada caso contrario. None quando o jogo nao tem solucao ou tem varias"""
+    if len(grid) == 9:
+        entry = lookup(grid)
+        if entry is not None and entry['solution'] is not None:
+            return entry['solution']
+    search = GridSearch(grid)
+    if search.run(2) != 1:
+        return None
+    return to_grid(search.solution)
+
+
+def first_hints(grid: Grid) -> List[Hint]:
+    """Deducoes que o SudokuSolver encontra no jogo inicial, sem tentativas"""
+    solver = SudokuSolver(grid)
+    hints = [(index, value, 'solved-cells') for index, value in solver.check_solved_cells()]
+    found = set(index for index, _, _ in hints)
+    for index, value in solver.check_singles():
+        if not index in found:
+            found.add(index)
+            hints.append((index, value, 'singles'))
+    return hints
+
+
+def precompute(grid: Grid) -> Dict[str, Any]:
+    """Calcula os dados guardados no banco para um jogo"""
+    stats = rate(grid)
+    return {
+        'grid': grid,
+        'solution': solve_grid(grid),
+        'score': stats['score'],
+        'difficulty': stats['difficulty'],
+        'hints': first_hints(grid),
+    }
+
+
+def build_bank(difficulty: str, directory: str = BANK_DIRECTORY, workers: Optional[int] = None) -> None:
+    """Recalcula os dados de todos os jogos do banco e regrava o arquivo"""
+    path = os.path.join(directory, difficulty + '.txt')
+    with open(path, 'r') as f:
+        grids = [entry['grid'] for entry in parse_bank(f.read())]
+    with Pool(workers or os.cpu_count() or 1) as pool:
+        entries = pool.map(precompute, grids)
+    with open(path, 'w') as f:
+        f.write(format_bank(entries))
+    clear_cache(path)
+
+
+if __name__ == '__main__':
+    import sys
+
+    for difficulty in sys.argv[1:] or DIFFICULTIES:
+        build_bank(difficulty)
+        print(difficulty, len(load_bank(difficulty)), 'jogos')
@@ -0,0 +1,132 @@
+"""Resolucao em lote com varios processos usando memoria compartilhada.
+
+As grades de entrada (81 bytes cada), as solucoes e as estatisticas ficam em
+buffers planos de multiprocessing.shared_memory; os workers recebem apenas
+intervalos de indices, entao nada alem de dois inteiros e serializado por tarefa.
+
+    python -m src.batch [repeticoes] [workers]
+"""
+from typing import List, Dict, Tuple, Sequence, Union, Optional, Any
+from multiprocessing import Pool, shared_memory
+import os
+
+from .sudoku import SudokuSolver
+from .search import Grid
+
+
+CELLS = 81
+STATS_FIELDS = ['solved', 'clues', 'steps', 'solved-cells', 'singles', 'double-pairs',
+    'attempts', 'attempt-change']
+
+_worker: Dict[str, Any] = {}
+
+
+def encode_grids(grids: Sequence[Grid]) -> bytes:
+    return bytes(value for grid in grids for row in grid for value in row)
+
+
+def decode_grid(data: Union[bytes, bytearray, memoryview], k: int) -> Grid:
+    cells = data[CELLS*k:CELLS*(k + 1)]
+    return [list(cells[9*i:9*i + 9]) for i in range(9)]
+
+
+def solve_into(grid: Grid, solution: memoryview, stats: memoryview) -> None:
+    """Resolve a grade escrevendo a solucao (81 bytes) e as estatisticas nas fatias dadas"""
+    solver = SudokuSolver(grid)
+    outcome = solver.solve_within()
+    if outcome['status'] == 'unsolvable':
+        stats[0] = 0
+        return
+    result = outcome['stats']
+    solution[:] = bytes(value for row in solver.sudoku.values for value in row)
+    stats[0] = 1
+    for f, field in enumerate(STATS_FIELDS[1:], 1):
+        stats[f] = result[field]
+
+
+def _attach(input_name: str, output_name: str, stats_name: str) -> None:
+    for key, name in (('input', input_name), ('output', output_name), ('stats', stats_name)):
+        _worker[key] = shared_memory.SharedMemory(name=name)
+    _worker['stats_view'] = _worker['stats'].buf.cast('i')
+
+
+def _solve_range(start: int, end: int) -> int:
+    grids, solutions = _worker['input'].buf, _worker['output'].buf
+    stats, n = _worker['stats_view'], len(STATS_FIELDS)
+    for k in range(start, end):
+        solve_into(decode_grid(grids, k), solutions[CELLS*k:CELLS*(k + 1)], stats[n*k:n*(k + 1)])
+    return end - start
+
+
+def solve_batch(grids: Union[bytes, Sequence[Grid]], workers: Optional[int] = None,
+        chunk_size: Optional[int] = None) -> Tuple[bytes, List[Dict[str, int]]]:
+    """Resolve um lote de grades (lista de grades ou bytes com 81 valores por grade).
+    Retorna as solucoes concatenadas (zeros para grades sem solucao) e as estatisticas"""
+    data = grids if isinstance(grids, (bytes, bytearray)) else encode_grids(grids)
+    size = len(data)//CELLS
+    if size == 0:
+        return b'', []
+    workers = workers or os.cpu_count() or 1
+    chunk_size = chunk_size or max(1, size//(4*workers))
+    n = len(STATS_FIELDS)
+
+    buffers = [shared_memory.SharedMemory(create=True, size=max(1, length))
+            for length in (len(data), len(data), 4*n*size)]
+    input_shm, output_shm, stats_shm = buffers
+    try:
+        input_shm.buf[:len(data)] = data
+        output_shm.buf[:len(data)] = bytes(len(data))
+        stats_shm.buf[:4*n*size] = bytes(4*n*size)
+        ranges = [(start, min(size, start + chunk_size)) for start in range(0, size, chunk_size)]
+        with Pool(workers, _attach, (input_shm.name, output_shm.name, stats_shm.name)) as pool:
+            pool.starmap(_solve_range, ranges)
+
+        solutions = bytes(output_shm.buf[:len(data)])
+        view = stats_shm.buf.cast('i')
+        values = view.tolist()
+        view.release()
+    finally:
+        for shm in buffers:
+            shm.close()
+            shm.unlink()
+
+    return solutions, [dict(zip(STATS_FIELDS, values[n*k:n*(k + 1)])) for k in range(size)]
+
+
+def _solve_one(grid: Grid) -> Tuple[Grid, Dict[str, int]]:
+    solver = SudokuSolver(grid)
+    outcome = solver.solve_within()
+    if outcome['status'] == 'unsolvable':
+        return grid, {}
+    return outcome['values'], outcome['stats']
+
+
+def solve_with_pool_map(grids: Sequence[Grid], workers: Optional[int] = None) -> List[Tuple[Grid, Dict[str, int]]]:
+    """Linha de base: Pool.map serializando as grades e os resultados"""
+    with Pool(workers or os.cpu_count() or 1) as pool:
+        return pool.map(_solve_one, grids)
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from .sudoku import read_sudoku
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    bank = [read_sudoku(difficulty, i) for difficulty in ['facil', 'medio', 'dificil', 'expert']
+            for i in range(15)]
+    grids = bank*repeat
+
+    start = time.perf_counter()
+    baseline = solve_with_pool_map(grids, workers)
+    baseline_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    solutions, stats = solve_batch(grids, workers)
+    shared_time = time.perf_counter() - start
+
+    assert all(decode_grid(solutions, k) == solution for k, (solution, _) in enumerate(baseline))
+    print(f'{len(grids)} grades')
+    print(f'Pool.map:            {baseline_time:.3f} s  ({len(grids)/baseline_time:.0f} grades/s)')
+    print(f'memoria compartilhada: {shared_time:.3f} s  ({len(grids)/shared_time:.0f} grades/s)')
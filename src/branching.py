@@ -0,0 +1,80 @@
+"""Heuristicas de ramificacao para as tentativas do SudokuSolver.
+
+A celula tentada pode ser a primeira com menos possibilidades achada pelo conjunto
+de celulas vazias ('classic', a original), a de menos possibilidades pelos baldes
+que o Sudoku mantem a cada possibilidade alterada ('mrv') ou, entre as empatadas, a
+com mais vizinhas vazias ('mrv-degree'). O valor tentado pode ser qualquer um
+('classic'), o menor ('ascending') ou o que menos aparece entre as possibilidades
+das vizinhas ('least-constraining'):
+
+    SudokuSolver(grid, cell_order='mrv-degree', value_order='least-constraining').solve()
+
+    python -m src.branching [dificuldades...]   # compara as combinacoes
+"""
+from typing import Dict, Set, Callable, Optional
+
+from .sudoku import Index, Sudoku
+
+
+CellOrder = Callable[[Sudoku], Index]
+ValueOrder = Callable[[Sudoku, Index, Set[int]], int]
+
+
+def degree(sudoku: Sudoku, index: Index) -> int:
+    """Numero de celulas vazias que compartilham linha, coluna ou caixa com index"""
+    values = sudoku._values
+    return sum(1 for i, j in sudoku.peers(index) if values[i][j] == 0 and (i, j) != index)
+
+
+def mrv(sudoku: Sudoku) -> Index:
+    return min(sudoku.most_constrained_cells())
+
+
+def mrv_degree(sudoku: Sudoku) -> Index:
+    return min(sudoku.most_constrained_cells(), key=lambda index: (-degree(sudoku, index), index))
+
+
+def ascending(sudoku: Sudoku, index: Index, candidates: Set[int]) -> int:
+    return min(candidates)
+
+
+def least_constraining(sudoku: Sudoku, index: Index, candidates: Set[int]) -> int:
+    """Valor que elimina menos possibilidades das celulas vizinhas vazias"""
+    values, possibilities = sudoku._values, sudoku._possibilities
+    def eliminated(value: int) -> int:
+        return sum(1 for i, j in sudoku.peers(index)
+                if values[i][j] == 0 and (i, j) != index and value in possibilities[i][j])
+    return min(candidates, key=lambda value: (eliminated(value), value))
+
+
+CELL_ORDERS: Dict[str, Optional[CellOrder]] = {
+    'classic': None,
+    'mrv': mrv,
+    'mrv-degree': mrv_degree,
+}
+VALUE_ORDERS: Dict[str, Optional[ValueOrder]] = {
+    'classic': None,
+    'ascending': ascending,
+    'least-constraining': least_constraining,
+}
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from .sudoku import SudokuSolver, read_sudoku
+
+    difficulties = sys.argv[1:] or ['dificil', 'expert']
+    grids = [read_sudoku(difficulty, i) for difficulty in difficulties for i in range(15)]
+    print(f"{'celula':<12}{'valor':<20}{'tentativas':>11}{'trocas':>8}{'passos':>8}{'tempo':>9}")
+    for cell_order in CELL_ORDERS:
+        for value_order in VALUE_ORDERS:
+            totals = {'attempts': 0, 'attempt-change': 0, 'steps': 0}
+            start = time.perf_counter()
+            for grid in grids:
+                stats = SudokuSolver(grid, cell_order=cell_order, value_order=value_order).solve()
+                for key in totals:
+                    totals[key] += stats[key]
+            elapsed = time.perf_counter() - start
+            print(f"{cell_order:<12}{value_order:<20}{totals['attempts']:>11}"
+                    f"{totals['attempt-change']:>8}{totals['steps']:>8}{elapsed:>8.3f}s")
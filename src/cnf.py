@@ -0,0 +1,349 @@
+"""Exportacao para CNF (DIMACS) e solver SAT de referencia.
+
+Cada celula (i, j) com valor v vira a variavel (i*n + j)*n + v. As unidades das
+variantes entram como linhas e colunas; grupos e vizinhos so proibem valores
+repetidos e as gaiolas escolhem uma das combinacoes por variaveis auxiliares.
+
+O DPLL daqui e lento mas pequeno o bastante para ser conferido a mao, e serve
+para comparar os motores rapidos (GridSearch, SudokuSolver ou um solver SAT
+externo) sem precisar de gabaritos escritos a mao:
+
+    problems = cross_check(read_sudoku('expert', 0))
+    open('expert.cnf', 'w').write(to_dimacs(read_sudoku('expert', 0)))
+
+    python -m src.cnf [repeticoes] [semente]
+"""
+from typing import List, Dict, Tuple, Optional, Sequence, Callable, Iterator
+from itertools import combinations
+import subprocess
+import tempfile
+import os
+
+from .sudoku import Index, Geometry, SudokuSolver, box_size_of
+from .search import Grid, solve_grid, count_solutions
+
+
+Clause = List[int]
+Engine = Callable[[Grid, Sequence], Optional[Grid]]
+
+
+def variable(index: Index, value: int, size: int) -> int:
+    return (index[0]*size + index[1])*size + value
+
+
+def to_cnf(grid: Grid, constraints: Sequence = ()) -> Tuple[int, List[Clause]]:
+    """Retorna o numero de variaveis e as clausulas do jogo"""
+    box_size = box_size_of(grid)
+    n = box_size*box_size
+    geometry = Geometry(box_size, constraints)
+    clauses: List[Clause] = []
+    cells = [(i, j) for i in range(n) for j in range(n)]
+    for index in cells:
+        clauses.append([variable(index, v, n) for v in range(1, n + 1)])
+        for a, b in combinations(range(1, n + 1), 2):
+            clauses.append([-variable(index, a, n), -variable(index, b, n)])
+
+    for unit in geometry.units:
+        for v in range(1, n + 1):
+            clauses.append([variable(index, v, n) for index in unit])
+    pairs = set()
+    for index in cells:
+        for peer in geometry.peers[index[0]][index[1]]:
+            if index < peer:
+                pairs.add((index, peer))
+    for a, b in sorted(pairs):
+        for v in range(1, n + 1):
+            clauses.append([-variable(a, v, n), -variable(b, v, n)])
+
+    num_vars = n*n*n
+    for cage_cells, cage_combinations in geometry.cages:
+        selectors = list(range(num_vars + 1, num_vars + len(cage_combinations) + 1))
+        num_vars += len(cage_combinations)
+        clauses.append(selectors)
+        for selector, combination in zip(selectors, cage_combinations):
+            for v in range(1, n + 1):
+                if combination >> v & 1:
+                    clauses.append([-selector] + [variable(index, v, n) for index in cage_cells])
+                else:
+                    clauses.extend([-selector, -variable(index, v, n)] for index in cage_cells)
+
+    for index in cells:
+        value = grid[index[0]][index[1]]
+        if value > 0:
+            clauses.append([variable(index, value, n)] if value <= n else [])
+    return num_vars, clauses
+
+
+def to_dimacs(grid: Grid, constraints: Sequence = ()) -> str:
+    num_vars, clauses = to_cnf(grid, constraints)
+    n = len(grid)
+    lines = [f'c sudoku {n}x{n}: variavel (i*{n} + j)*{n} + v para o valor v na celula (i, j)',
+        f'p cnf {num_vars} {len(clauses)}']
+    lines.extend(' '.join(map(str, clause + [0])) for clause in clauses)
+    return '\n'.join(lines) + '\n'
+
+
+def from_model(model: Sequence[int], size: int) -> Grid:
+    """Converte os literais verdadeiros de um modelo de volta em uma grade"""
+    grid = [[0]*size for _ in range(size)]
+    for literal in model:
+        if 0 < literal <= size*size*size:
+            cell, value = divmod(literal - 1, size)
+            grid[cell//size][cell%size] = value + 1
+    return grid
+
+
+def satisfies(clauses: List[Clause], model: Sequence[int]) -> bool:
+    true = set(literal for literal in model if literal > 0)
+    return all(any((literal > 0) == (abs(literal) in true) for literal in clause)
+            for clause in clauses)
+
+
+class DPLL:
+    """DPLL com propagacao unitaria por literais vigiados e retrocesso cronologico.
+    Enumera modelos completos sem repetir, entao tambem serve para contar solucoes"""
+    def __init__(self, num_vars: int, clauses: List[Clause]):
+        self.num_vars = num_vars
+        self.clauses: List[Clause] = []
+        self.assignment: List[int] = [0]*(num_vars + 1)
+        self.watches: Dict[int, List[int]] = {}
+        self.trail: List[int] = []
+        self.units: List[int] = []
+        self.valid = True
+        self.decisions = 0
+        self.conflicts = 0
+        for clause in clauses:
+            clause = list(dict.fromkeys(clause))
+            if any(-literal in clause for literal in clause):
+                continue
+            if len(clause) == 0:
+                self.valid = False
+            elif len(clause) == 1:
+                self.units.append(clause[0])
+            else:
+                for literal in clause[:2]:
+                    self.watches.setdefault(literal, []).append(len(self.clauses))
+                self.clauses.append(clause)
+
+    def value(self, literal: int) -> int:
+        value = self.assignment[abs(literal)]
+        return value if literal > 0 else -value
+
+    def _assign(self, literal: int) -> bool:
+        value = self.value(literal)
+        if value != 0:
+            return value > 0
+        self.assignment[abs(literal)] = 1 if literal > 0 else -1
+        self.trail.append(literal)
+        return True
+
+    def _propagate(self, head: int) -> bool:
+        """Propaga os literais da trilha a partir de head; retorna falso em conflito"""
+        clauses, assignment = self.clauses, self.assignment
+        while head < len(self.trail):
+            false = -self.trail[head]
+            head += 1
+            watching = self.watches.get(false, [])
+            kept = []
+            for w, c in enumerate(watching):
+                clause = clauses[c]
+                if clause[0] == false:
+                    clause[0], clause[1] = clause[1], false
+                if self.value(clause[0]) > 0:
+                    kept.append(c)
+                    continue
+                for k in range(2, len(clause)):
+                    if self.value(clause[k]) >= 0:
+                        clause[1], clause[k] = clause[k], false
+                        self.watches.setdefault(clause[1], []).append(c)
+                        break
+                else:
+                    kept.append(c)
+                    if not self._assign(clause[0]):
+                        kept.extend(watching[w + 1:])
+                        self.watches[false] = kept
+                        return False
+            self.watches[false] = kept
+        return True
+
+    def _choose(self) -> int:
+        """Primeiro literal livre da clausula nao satisfeita com menos literais livres"""
+        best, best_free = 0, self.num_vars + 1
+        for clause in self.clauses:
+            free = 0
+            literal = 0
+            for lit in clause:
+                value = self.value(lit)
+                if value > 0:
+                    break
+                if value == 0:
+                    free += 1
+                    literal = literal or lit
+            else:
+                if free < best_free:
+                    best, best_free = literal, free
+                    if free <= 2:
+                        break
+        if best == 0:
+            for var in range(1, self.num_vars + 1):
+                if self.assignment[var] == 0:
+                    return var
+        return best
+
+    def _undo(self, length: int) -> None:
+        while len(self.trail) > length:
+            self.assignment[abs(self.trail.pop())] = 0
+
+    def models(self) -> Iterator[List[int]]:
+        """Gera cada modelo como a lista dos literais verdadeiros e falsos"""
+        if not self.valid:
+            return
+        self._undo(0)
+        if not all(self._assign(literal) for literal in self.units) or not self._propagate(0):
+            return
+        levels: List[Tuple[int, int, bool]] = []
+        while True:
+            if len(self.trail) == self.num_vars:
+                yield [var*self.assignment[var] for var in range(1, self.num_vars + 1)]
+                conflict = True
+            else:
+                literal = self._choose()
+                self.decisions += 1
+                levels.append((len(self.trail), literal, False))
+                head = len(self.trail)
+                self._assign(literal)
+                conflict = not self._propagate(head)
+
+            while conflict:
+                self.conflicts += 1
+                while levels and levels[-1][2]:
+                    levels.pop()
+                if not levels:
+                    return
+                length, literal, _ = levels.pop()
+                self._undo(length)
+                levels.append((length, -literal, True))
+                self._assign(-literal)
+                conflict = not self._propagate(length)
+
+    def solve(self) -> Optional[List[int]]:
+        return next(self.models(), None)
+
+    def count(self, limit: int = 0) -> int:
+        count = 0
+        for _ in self.models():
+            count += 1
+            if count == limit:
+                break
+        return count
+
+
+def sat_solutions(grid: Grid, constraints: Sequence = (), limit: int = 2) -> List[Grid]:
+    """Retorna ate limit solucoes do jogo pelo DPLL de referencia"""
+    num_vars, clauses = to_cnf(grid, constraints)
+    solutions = []
+    for model in DPLL(num_vars, clauses).models():
+        solutions.append(from_model(model, len(grid)))
+        if len(solutions) == limit:
+            break
+    return solutions
+
+
+def external_solve(command: Sequence[str], grid: Grid, constraints: Sequence = (),
+        timeout: Optional[float] = None) -> Optional[Grid]:
+    """Resolve com um solver SAT externo no formato da competicao (linhas 's' e 'v'
+    na saida padrao, como kissat e cadical); o arquivo .cnf e o ultimo argumento"""
+    with tempfile.NamedTemporaryFile('w', suffix='.cnf', delete=False) as f:
+        f.write(to_dimacs(grid, constraints))
+    try:
+        output = subprocess.run(list(command) + [f.name], capture_output=True, text=True,
+                timeout=timeout).stdout
+    finally:
+        os.remove(f.name)
+    model: List[int] = []
+    satisfiable = False
+    for line in output.splitlines():
+        if line.startswith('s '):
+            satisfiable = line.split()[1] == 'SATISFIABLE'
+        elif line.startswith('v '):
+            model.extend(int(literal) for literal in line.split()[1:])
+    return from_model(model, len(grid)) if satisfiable else None
+
+
+def _search_engine(grid: Grid, constraints: Sequence) -> Optional[Grid]:
+    return solve_grid(grid, constraints)
+
+
+def _solver_engine(grid: Grid, constraints: Sequence) -> Optional[Grid]:
+    solver = SudokuSolver(grid, constraints)
+    solver.solve()
+    return solver.sudoku.values
+
+
+ENGINES: Dict[str, Engine] = {
+    'search': _search_engine,
+    'solver': _solver_engine,
+}
+
+
+def cross_check(grid: Grid, constraints: Sequence = (),
+        engines: Optional[Dict[str, Engine]] = None) -> List[str]:
+    """Compara os motores com o DPLL de referencia e retorna as divergencias
+    encontradas (lista vazia quando todos concordam). Os motores so sao chamados
+    em jogos com solucao, pois o SudokuSolver supoe que ela exista"""
+    engines = ENGINES if engines is None else engines
+    num_vars, clauses = to_cnf(grid, constraints)
+    n = len(grid)
+    solutions = sat_solutions(grid, constraints, 2)
+    problems = []
+    count = count_solutions(grid, 2, constraints)
+    if count != len(solutions):
+        problems.append(f'count_solutions: {count} solucoes, referencia: {len(solutions)}')
+    if not solutions:
+        return problems
+
+    for name, engine in engines.items():
+        try:
+            result = engine(grid, constraints)
+        except Exception as e:
+            problems.append(f'{name}: {type(e).__name__}: {e}')
+            continue
+        if result is None:
+            problems.append(f'{name}: nenhuma solucao, referencia tem solucao')
+            continue
+        model = [variable((i, j), v, n) * (1 if result[i][j] == v else -1)
+                for i in range(n) for j in range(n) for v in range(1, n + 1)]
+        if any(result[i][j] == 0 for i in range(n) for j in range(n)):
+            problems.append(f'{name}: grade incompleta')
+        elif len(solutions) == 1 and result != solutions[0]:
+            problems.append(f'{name}: solucao diferente da referencia')
+        elif not satisfies([c for c in clauses if all(abs(l) <= n*n*n for l in c)], model):
+            problems.append(f'{name}: solucao viola as regras')
+    return problems
+
+
+if __name__ == '__main__':
+    import sys
+    import random
+    import time
+    from .sudoku import read_sudoku
+    from .generator import dig
+    from .search import random_full_grid
+    from .variants import Diagonal, Windoku, AntiKing
+
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    rng = random.Random(int(sys.argv[2]) if len(sys.argv) > 2 else 0)
+    cases = [(read_sudoku(difficulty, i), ()) for difficulty in ['facil', 'medio', 'dificil', 'expert']
+            for i in range(15)]
+    for constraints in ([Diagonal()], [Windoku()], [AntiKing()]) * repeat:
+        full = random_full_grid(rng, constraints=constraints)
+        cases.append((dig(full, rng.randint(20, 40), rng, constraints), constraints))
+
+    start = time.perf_counter()
+    failures = 0
+    for k, (grid, constraints) in enumerate(cases):
+        problems = cross_check(grid, constraints)
+        if problems:
+            failures += 1
+            print(k, [type(c).__name__ for c in constraints], problems)
+    print(f'{len(cases)} jogos, {failures} com divergencias, {time.perf_counter() - start:.2f} s')
@@ -0,0 +1,284 @@
+"""Fuzzing diferencial do Sudoku e dos solvers.
+
+Gera grades aleatorias (validas, com varias solucoes ou com conflitos) e
+sequencias de edicoes como as do GamePage (mudar valor, limpar, desfazer, limpar
+as celulas livres, travar) intercaladas com pedidos de resolucao. Depois de cada
+operacao compara valores, possibilidades, celulas vazias e celulas com erro de
+cada motor com um modelo de referencia que recalcula tudo do zero. Casos que
+falham sao reduzidos (menos operacoes e menos pistas) antes de serem relatados.
+
+    failures = fuzz(200, seed=0, engines={'sudoku': Sudoku, 'novo': SudokuRapido})
+
+    python -m src.fuzz [casos] [semente]
+"""
+from typing import List, Dict, Tuple, Set, Optional, Sequence, Callable, Any
+import random
+
+from .sudoku import Index, Sudoku, cage_allowed
+from .search import Grid, random_full_grid, count_solutions, solve_grid
+from .generator import dig
+from .cnf import ENGINES as SOLVERS
+from .variants import Diagonal, AntiKing, KillerCage
+
+
+Op = Tuple[Any, ...]
+Factory = Callable[[Grid, Sequence], Sudoku]
+
+ENGINES: Dict[str, Factory] = {
+    'sudoku': lambda grid, constraints: Sudoku(grid, constraints=constraints),
+}
+# gaiolas {1, 2, 3}, {7, 8, 9} e {1, 2}, que as grades completas sorteadas conseguem satisfazer
+VARIANTS = [(), (), (), (Diagonal(),), (AntiKing(),),
+    (KillerCage([(0, 0), (0, 1), (1, 1)], 6), KillerCage([(4, 3), (4, 4), (4, 5)], 24),
+    KillerCage([(7, 2), (8, 2)], 3))]
+
+
+class ReferenceSudoku:
+    """Modelo lento e direto: guarda so os valores e recalcula o resto a cada consulta"""
+    def __init__(self, grid: Grid, constraints: Sequence = ()):
+        self.size = n = len(grid)
+        box_size = int(n**0.5)
+        self.values = [row.copy() for row in grid]
+        self.locked = set((i, j) for i in range(n) for j in range(n) if grid[i][j] > 0)
+        self.history: List[Grid] = []
+        self.cages = [cage for constraint in constraints for cage in constraint.cages(box_size)]
+        self.peers: Dict[Index, Set[Index]] = {}
+        for i in range(n):
+            for j in range(n):
+                self.peers[(i, j)] = set((a, b) for a in range(n) for b in range(n)
+                        if a == i or b == j or (a//box_size, b//box_size) == (i//box_size, j//box_size))
+        for constraint in constraints:
+            for group in constraint.units(box_size) + constraint.groups(box_size):
+                for a in group:
+                    self.peers[a].update(group)
+            for a, b in constraint.neighbors(box_size):
+                self.peers[a].add(b)
+                self.peers[b].add(a)
+
+    def change_value(self, index: Index, value: int) -> None:
+        if 0 <= value <= self.size:
+            self.history.append([row.copy() for row in self.values])
+            self.values[index[0]][index[1]] = value
+
+    def undo(self) -> None:
+        if self.history:
+            self.values = self.history.pop()
+
+    def clean_unloked_cells(self) -> None:
+        for i in range(self.size):
+            for j in range(self.size):
+                if not (i, j) in self.locked:
+                    self.values[i][j] = 0
+        self.history = []
+
+    def lock_nonzero_indexes(self) -> None:
+        self.locked.update((i, j) for i in range(self.size) for j in range(self.size)
+                if self.values[i][j] > 0)
+
+    def cage_allows(self, index: Index, value: int, with_index: bool = False) -> bool:
+        """Indica se value completa alguma combinacao de cada gaiola de index junto com
+        os valores das outras celulas da gaiola (e o da propria, com with_index, como
+        nas possibilidades que o Sudoku guarda)"""
+        for cells, combinations in self.cages:
+            if index in cells:
+                placed = 0
+                for i, j in cells:
+                    if (with_index or (i, j) != index) and self.values[i][j] > 0:
+                        placed |= 1 << self.values[i][j]
+                if not cage_allowed(combinations, placed) >> value & 1:
+                    return False
+        return True
+
+    def possibilities(self, index: Index) -> Set[int]:
+        used = set(self.values[i][j] for i, j in self.peers[index])
+        return set(value for value in range(1, self.size + 1)
+                if not value in used and self.cage_allows(index, value, True))
+
+    def error_cells(self) -> Set[Index]:
+        return set(index for index in self.peers if self.values[index[0]][index[1]] > 0
+                and (any(peer != index and self.values[peer[0]][peer[1]] == self.values[index[0]][index[1]]
+                for peer in self.peers[index])
+                or not self.cage_allows(index, self.values[index[0]][index[1]])))
+
+
+def state_of(sudoku: Sudoku) -> Dict[str, Any]:
+    n = sudoku.size
+    return {
+        'values': sudoku.values,
+        'possibilities': [[sudoku.get_possibilities((i, j)) for j in range(n)] for i in range(n)],
+        'empty': sudoku.empty_cells,
+        'errors': sudoku.error_cells,
+        'locked': set(sudoku.locked_indexes),
+    }
+
+
+def reference_state(reference: ReferenceSudoku) -> Dict[str, Any]:
+    n = reference.size
+    return {
+        'values': [row.copy() for row in reference.values],
+        'possibilities': [[reference.possibilities((i, j)) for j in range(n)] for i in range(n)],
+        'empty': set((i, j) for i in range(n) for j in range(n) if reference.values[i][j] == 0),
+        'errors': reference.error_cells(),
+        'locked': set(reference.locked),
+    }
+
+
+def check_solvers(grid: Grid, constraints: Sequence) -> Optional[str]:
+    """Compara os solvers em um jogo sem conflitos; jogos sem solucao sao ignorados
+    porque o SudokuSolver supoe que a solucao exista"""
+    count = count_solutions(grid, 2, constraints)
+    if count == 0:
+        return None
+    expected = solve_grid(grid, constraints) if count == 1 else None
+    reference = ReferenceSudoku(grid, constraints)
+    n = len(grid)
+    for name, solver in SOLVERS.items():
+        result = solver(grid, constraints)
+        if result is None:
+            return f'{name}: nenhuma solucao'
+        if expected is not None and result != expected:
+            return f'{name}: solucao diferente da unica solucao'
+        if any(grid[i][j] and grid[i][j] != result[i][j] for i in range(n) for j in range(n)):
+            return f'{name}: solucao altera as pistas'
+        reference.values = result
+        if any(0 in row for row in result) or reference.error_cells():
+            return f'{name}: solucao invalida'
+    return None
+
+
+def run_case(grid: Grid, ops: Sequence[Op], constraints: Sequence = (),
+        factory: Factory = ENGINES['sudoku']) -> Optional[str]:
+    """Executa as operacoes e retorna a primeira divergencia ou None"""
+    try:
+        sudoku = factory(grid, constraints)
+    except Exception as e:
+        return f'construcao: {type(e).__name__}: {e}'
+    reference = ReferenceSudoku(grid, constraints)
+    for k, op in enumerate([('init',)] + list(ops)):
+        try:
+            if op[0] == 'set':
+                sudoku.change_value(op[1], op[2])
+                reference.change_value(op[1], op[2])
+            elif op[0] == 'undo':
+                sudoku.undo()
+                reference.undo()
+            elif op[0] == 'clean':
+                sudoku.clean_unloked_cells()
+                reference.clean_unloked_cells()
+            elif op[0] == 'lock':
+                sudoku.lock_nonzero_indexes()
+                reference.lock_nonzero_indexes()
+            elif op[0] == 'solve' and not sudoku.has_error_cells():
+                problem = check_solvers(sudoku.values, constraints)
+                if problem is not None:
+                    return f'operacao {k} {op}: {problem}'
+        except Exception as e:
+            return f'operacao {k} {op}: {type(e).__name__}: {e}'
+
+        state, expected = state_of(sudoku), reference_state(reference)
+        for key in expected:
+            if state[key] != expected[key]:
+                return f'operacao {k} {op}: {key} diverge'
+    return None
+
+
+def random_grid(rng: random.Random, box_size: int, constraints: Sequence) -> Grid:
+    n = box_size*box_size
+    kind = rng.random()
+    if kind < 0.1:
+        return [[rng.choice([0, 0, rng.randint(1, n)]) for _ in range(n)] for _ in range(n)]
+    full = random_full_grid(rng, box_size, constraints)
+    clues = rng.randint(n*n//5, n*n//2)
+    if kind < 0.5 and not constraints:
+        return dig(full, clues, rng, constraints)
+    cells = rng.sample(range(n*n), n*n - clues)
+    for cell in cells:
+        full[cell//n][cell%n] = 0
+    return full
+
+
+def random_ops(rng: random.Random, grid: Grid, length: int) -> List[Op]:
+    n = len(grid)
+    free = [(i, j) for i in range(n) for j in range(n) if grid[i][j] == 0] or [(0, 0)]
+    ops: List[Op] = []
+    for _ in range(length):
+        kind = rng.random()
+        if kind < 0.55:
+            ops.append(('set', rng.choice(free), rng.randint(1, n)))
+        elif kind < 0.65:
+            ops.append(('set', rng.choice(free), 0))
+        elif kind < 0.85:
+            ops.append(('undo',))
+        elif kind < 0.88:
+            ops.append(('set', rng.choice(free), n + 1))
+        elif kind < 0.91:
+            ops.append(('clean',))
+        elif kind < 0.93:
+            ops.append(('lock',))
+        else:
+            ops.append(('solve',))
+    return ops
+
+
+def shrink(grid: Grid, ops: List[Op], constraints: Sequence, factory: Factory) -> Tuple[Grid, List[Op]]:
+    """Remove blocos de operacoes e pistas enquanto o caso continuar falhando"""
+    chunk = max(1, len(ops)//2)
+    while chunk >= 1:
+        start = 0
+        while start < len(ops):
+            candidate = ops[:start] + ops[start + chunk:]
+            if run_case(grid, candidate, constraints, factory) is not None:
+                ops = candidate
+            else:
+                start += chunk
+        chunk //= 2
+
+    n = len(grid)
+    for i in range(n):
+        for j in range(n):
+            if grid[i][j] != 0:
+                candidate = [row.copy() for row in grid]
+                candidate[i][j] = 0
+                if run_case(candidate, ops, constraints, factory) is not None:
+                    grid = candidate
+    return grid, ops
+
+
+def fuzz(cases: int = 200, seed: int = 0, engines: Optional[Dict[str, Factory]] = None,
+        max_ops: int = 40) -> List[Dict[str, Any]]:
+    """Roda cases casos aleatorios em cada motor e retorna as falhas ja reduzidas"""
+    engines = ENGINES if engines is None else engines
+    rng = random.Random(seed)
+    failures = []
+    for case in range(cases):
+        box_size = rng.choice([2, 3, 3, 3])
+        constraints = rng.choice(VARIANTS) if box_size == 3 else ()
+        grid = random_grid(rng, box_size, constraints)
+        ops = random_ops(rng, grid, rng.randint(0, max_ops))
+        for name, factory in engines.items():
+            if run_case(grid, ops, constraints, factory) is None:
+                continue
+            small_grid, small_ops = shrink(grid, ops, constraints, factory)
+            failures.append({
+                'case': case,
+                'engine': name,
+                'constraints': [type(constraint).__name__ for constraint in constraints],
+                'problem': run_case(small_grid, small_ops, constraints, factory),
+                'grid': small_grid,
+                'ops': small_ops,
+            })
+    return failures
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    cases = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    seed = int(sys.argv[2]) if len(sys.argv) > 2 else random.randrange(1 << 30)
+    start = time.perf_counter()
+    failures = fuzz(cases, seed)
+    for failure in failures:
+        print(failure)
+    print(f'{cases} casos, semente {seed}, {len(failures)} falhas, {time.perf_counter() - start:.2f} s')
+    sys.exit(1 if failures else 0)
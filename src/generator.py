@@ -0,0 +1,234 @@
+from typing import List, Dict, Tuple, Optional, Union, Sequence, Callable, Any
+from multiprocessing import Pool
+import random
+import time
+import os
+
+from .sudoku import Index, SudokuSolver
+from .search import Grid, has_unique_solution, random_full_grid
+
+
+DIFFICULTIES = ['facil', 'medio', 'dificil', 'expert']
+TARGET_CLUES = {'facil': 38, 'medio': 30, 'dificil': 25, 'expert': 22}
+SCORE_LIMITS = {'facil': 45, 'medio': 85, 'dificil': 150}
+
+
+def score(stats: Dict[str, int]) -> int:
+    """Pontua um jogo pelas tecnicas que o SudokuSolver precisou usar"""
+    return (stats['solved-cells'] + 2*stats['singles'] + 10*stats['double-pairs']
+            + 50*(stats['attempts'] + stats['attempt-change']))
+
+
+def difficulty_of(points: int) -> str:
+    for difficulty in DIFFICULTIES[:-1]:
+        if points <= SCORE_LIMITS[difficulty]:
+            return difficulty
+    return DIFFICULTIES[-1]
+
+
+def rate(grid: Grid, deadline: Optional[float] = None) -> Dict[str, Union[str, int]]:
+    """Retorna as estatisticas do SudokuSolver, a pontuacao e a dificuldade do jogo.
+    Levanta TimeoutError se a resolucao passar do instante deadline (de time.monotonic())"""
+    outcome = SudokuSolver(grid).solve_within(deadline)
+    if outcome['status'] == 'unsolvable':
+        raise ValueError('Sudoku has no solution')
+    if outcome['status'] == 'timeout':
+        raise TimeoutError('Rating timed out')
+    stats: Dict[str, Union[str, int]] = dict(outcome['stats'])
+    stats['score'] = score(stats)
+    stats['difficulty'] = difficulty_of(stats['score'])
+    return stats
+
+
+def _rotational(index: Index, n: int) -> List[Index]:
+    return [index, (n - 1 - index[0], n - 1 - index[1])]
+
+
+def _mirror(index: Index, n: int) -> List[Index]:
+    return [index, (index[0], n - 1 - index[1])]
+
+
+def _diagonal(index: Index, n: int) -> List[Index]:
+    return [index, (index[1], index[0])]
+
+
+SYMMETRIES: Dict[str, Callable[[Index, int], List[Index]]] = {
+    'none': lambda index, n: [index],
+    'rotational': _rotational,
+    'mirror': _mirror,
+    'diagonal': _diagonal,
+}
+
+
+def _orbits(grid: Grid, rng: random.Random, symmetry: str) -> List[List[Index]]:
+    """Grupos de pistas removidas juntas para manter a simetria, em ordem aleatoria"""
+    if not symmetry in SYMMETRIES:
+        raise ValueError(f"Invalid symmetry: '{symmetry}'")
+    n = len(grid)
+    indexes = [(i, j) for i in range(n) for j in range(n) if grid[i][j] != 0]
+    rng.shuffle(indexes)
+    orbits: List[List[Index]] = []
+    seen = set()
+    for index in indexes:
+        if not index in seen:
+            orbit = [(i, j) for i, j in dict.fromkeys(SYMMETRIES[symmetry](index, n)) if grid[i][j] != 0]
+            seen.update(orbit)
+            orbits.append(orbit)
+    return orbits
+
+
+def _keeps_unique(task: Tuple[Grid, List[Index], Sequence]) -> bool:
+    grid, orbit, constraints = task
+    grid = [row.copy() for row in grid]
+    for i, j in orbit:
+        grid[i][j] = 0
+    return has_unique_solution(grid, constraints)
+
+
+def _expired(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.monotonic() >= deadline
+
+
+def dig(grid: Grid, clues: int, rng: random.Random, constraints: Sequence = (),
+        symmetry: str = 'none', pool: Optional[Any] = None, batch: Optional[int] = None,
+        deadline: Optional[float] = None) -> Grid:
+    """Remove pistas uma a uma (ou um grupo simetrico por vez), em ordem aleatoria,
+    mantendo a solucao unica ate restarem clues pistas ou nenhuma poder ser removida.
+    Com um multiprocessing.Pool, testa batch remocoes de uma vez e aplica a primeira
+    que mantem a solucao unica. Uma remocao que falha nunca mais passa (tirar mais
+    pistas so aumenta as solucoes), entao o resultado e o mesmo da versao sequencial.
+    No instante deadline (de time.monotonic()) para de remover e retorna a grade
+    como esta, ainda com solucao unica"""
+    grid = [row.copy() for row in grid]
+    orbits = _orbits(grid, rng, symmetry)
+    remaining = sum(len(orbit) for orbit in orbits)
+    if pool is not None:
+        return _dig_speculative(grid, orbits, remaining, clues, constraints, pool,
+                batch or 2*(os.cpu_count() or 1), deadline)
+
+    for orbit in orbits:
+        if remaining <= clues or _expired(deadline):
+            break
+        if remaining - len(orbit) < clues:
+            continue
+        values = [grid[i][j] for i, j in orbit]
+        for i, j in orbit:
+            grid[i][j] = 0
+        if has_unique_solution(grid, constraints):
+            remaining -= len(orbit)
+        else:
+            for (i, j), value in zip(orbit, values):
+                grid[i][j] = value
+    return grid
+
+
+def _dig_speculative(grid: Grid, orbits: List[List[Index]], remaining: int, clues: int,
+        constraints: Sequence, pool: Any, batch: int, deadline: Optional[float]) -> Grid:
+    pending = orbits
+    while pending and remaining > clues and not _expired(deadline):
+        candidates: List[List[Index]] = []
+        taken = 0
+        for orbit in pending:
+            if len(candidates) == batch:
+                break
+            taken += 1
+            if remaining - len(orbit) >= clues:
+                candidates.append(orbit)
+        results = pool.map(_keeps_unique, [(grid, orbit, constraints) for orbit in candidates])
+        if not True in results:
+            pending = pending[taken:]
+            continue
+        first = results.index(True)
+        for i, j in candidates[first]:
+            grid[i][j] = 0
+        remaining -= len(candidates[first])
+        # as que falharam continuam falhando; as que passaram depois da aplicada sao
+        # testadas de novo contra a grade nova
+        pending = [orbit for orbit, unique in zip(candidates[first + 1:], results[first + 1:])
+                if unique] + pending[taken:]
+    return grid
+
+
+def is_minimal(grid: Grid, constraints: Sequence = ()) -> bool:
+    """Indica se todas as pistas sao necessarias: tirar qualquer uma deixa o jogo
+    com mais de uma solucao"""
+    n = len(grid)
+    for i in range(n):
+        for j in range(n):
+            if grid[i][j] != 0:
+                value = grid[i][j]
+                grid[i][j] = 0
+                unique = has_unique_solution(grid, constraints)
+                grid[i][j] = value
+                if unique:
+                    return False
+    return True
+
+
+def generate(difficulty: Optional[str] = None, seed: Optional[int] = None,
+        max_tries: int = 20, symmetry: str = 'none', workers: int = 1,
+        deadline: Optional[float] = None, minimal: bool = False) -> Grid:
+    """Gera um jogo de solucao unica com a dificuldade pedida. Caso nenhuma
+    tentativa acerte a dificuldade retorna a de pontuacao mais proxima. Com
+    workers > 1 as remocoes de pistas sao testadas em paralelo (mesmo resultado).
+    Com minimal, remove pistas alem do alvo da dificuldade enquanto for possivel e
+    so aceita tentativas aprovadas por is_minimal (com simetria, algumas nao sao).
+    No instante deadline (de time.monotonic()) nao comeca novas tentativas nem
+    remove mais pistas e retorna a melhor tentativa ate ali"""
+    if workers > 1:
+        with Pool(workers) as pool:
+            return _generate(difficulty, seed, max_tries, symmetry, pool, deadline, minimal)
+    return _generate(difficulty, seed, max_tries, symmetry, None, deadline, minimal)
+
+
+def _generate(difficulty: Optional[str], seed: Optional[int], max_tries: int, symmetry: str,
+        pool: Optional[Any], deadline: Optional[float] = None, minimal: bool = False) -> Grid:
+    rng = random.Random(seed)
+    if difficulty is None:
+        difficulty = rng.choice(DIFFICULTIES)
+    if not difficulty in DIFFICULTIES:
+        raise ValueError(f"Invalid difficulty: '{difficulty}'")
+
+    target = DIFFICULTIES.index(difficulty)
+    clues = 0 if minimal else TARGET_CLUES[difficulty]
+    best: Optional[Grid] = None
+    best_distance = 0
+    for _ in range(max_tries):
+        if best is not None and _expired(deadline):
+            break
+        grid = dig(random_full_grid(rng), clues, rng, symmetry=symmetry, pool=pool, deadline=deadline)
+        distance = abs(DIFFICULTIES.index(rate(grid)['difficulty']) - target)
+        if minimal and not is_minimal(grid):
+            # so serve se nenhuma tentativa minima aparecer
+            distance += len(DIFFICULTIES)
+        if best is None or distance < best_distance:
+            best, best_distance = grid, distance
+        if distance == 0:
+            break
+    return best
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    fulls = [random_full_grid(random.Random(seed)) for seed in range(5)]
+    with Pool(workers) as pool:
+        for symmetry in SYMMETRIES:
+            for name, worker_pool in (('sequencial', None), (f'{workers} workers', pool)):
+                start = time.perf_counter()
+                grids = [dig(full, 17, random.Random(seed), symmetry=symmetry, pool=worker_pool)
+                        for seed, full in enumerate(fulls)]
+                elapsed = time.perf_counter() - start
+                clues = sum(value != 0 for grid in grids for row in grid for value in row)/len(grids)
+                minimal = sum(is_minimal(grid) for grid in grids)
+                print(f'{symmetry:<11}{name:<12}{elapsed:7.2f} s  {clues:5.1f} pistas  '
+                        f'{minimal}/{len(grids)} minimos')
+
+    for difficulty in DIFFICULTIES:
+        start = time.perf_counter()
+        grid = generate(difficulty, 0, minimal=True, deadline=time.monotonic() + 5)
+        clues = sum(value != 0 for row in grid for value in row)
+        print(f'generate {difficulty:<8} minimal {time.perf_counter() - start:6.2f} s  {clues} pistas  '
+                f'{rate(grid)["difficulty"]:<8} {"minimo" if is_minimal(grid) else "nao minimo"}')
@@ -0,0 +1,45 @@
+"""Mede o tempo de importacao de cada camada em processos novos
+
+    python -m src.import_benchmark [repeticoes]
+"""
+from typing import List, Dict
+import statistics
+import subprocess
+import sys
+
+
+STATEMENTS = {
+    'src': 'import src',
+    'src.Sudoku': 'import src; src.Sudoku',
+    'src.search': 'import src.search',
+    'src.generator': 'import src.generator',
+    'src.server': 'import src.server',
+    'src.pages (pygame)': 'import src.pages',
+}
+
+
+def measure(statement: str, repeat: int = 5) -> List[float]:
+    """Retorna o tempo em ms de cada execucao de um interpretador que roda statement"""
+    code = ('import time; _start = time.perf_counter(); ' + statement
+            + '; print((time.perf_counter() - _start)*1000)')
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.split()[-1]))
+    return times
+
+
+def run(repeat: int = 5) -> Dict[str, float]:
+    results = {}
+    for name, statement in STATEMENTS.items():
+        try:
+            results[name] = statistics.median(measure(statement, repeat))
+        except subprocess.CalledProcessError:
+            results[name] = float('nan')
+    return results
+
+
+if __name__ == '__main__':
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+    for name, ms in run(repeat).items():
+        print(f'{name:<22}{ms:8.1f} ms')
@@ -0,0 +1,113 @@
+"""Anotacoes das celulas (manuais ou automaticas) em mascaras de bits.
+
+As notas automaticas sao as possibilidades do Sudoku; as manuais sao escolhidas
+pelo jogador e perdem automaticamente os valores colocados em celulas vizinhas.
+As duas ficam sempre atualizadas a partir das mudancas de valor do Sudoku, entao
+alternar entre elas nao recalcula nada. Quem desenha registra um listener para
+saber quais celulas mudaram:
+
+    notes = Notes(sudoku)
+    notes.add_listener(lambda cells: ...)
+    notes.toggle((0, 0), 5)
+    notes.auto = True
+    notes.values((0, 0))
+"""
+from typing import List, Set, Callable, Iterable, Optional
+
+from .sudoku import Index, Sudoku
+
+
+NotesListener = Callable[[Iterable[Index]], None]
+
+
+class Notes:
+    def __init__(self, sudoku: Sudoku, auto: bool = False):
+        self.sudoku = sudoku
+        self._auto = auto
+        self._listeners: List[NotesListener] = []
+        self._manual: List[List[int]] = []
+        self._automatic: List[List[int]] = []
+        self._stale: Set[Index] = set()
+        self._reset()
+        sudoku.add_listener(self._on_change)
+
+    def _reset(self) -> None:
+        n = self.sudoku.size
+        self._manual = [[0]*n for _ in range(n)]
+        self._automatic = [[0]*n for _ in range(n)]
+        self._stale = set((i, j) for i in range(n) for j in range(n))
+
+    @property
+    def auto(self) -> bool:
+        return self._auto
+
+    @auto.setter
+    def auto(self, auto: bool) -> None:
+        if auto != self._auto:
+            self._auto = auto
+            self._emit(self._all_cells())
+
+    def add_listener(self, listener: NotesListener) -> None:
+        """Registra uma funcao chamada com as celulas cujas notas mudaram"""
+        self._listeners.append(listener)
+
+    def _emit(self, cells: Iterable[Index]) -> None:
+        for listener in self._listeners:
+            listener(cells)
+
+    def _all_cells(self) -> List[Index]:
+        n = self.sudoku.size
+        return [(i, j) for i in range(n) for j in range(n)]
+
+    def _on_change(self, index: Optional[Index]) -> None:
+        """Recebe as mudancas de valor do Sudoku: as notas automaticas dos vizinhos
+        ficam para recalcular na proxima leitura e as manuais perdem o valor colocado"""
+        if index is None:
+            self._reset()
+            self._emit(self._all_cells())
+            return
+        peers = self.sudoku.peers(index)
+        self._stale.update(peers)
+        value = self.sudoku.get_value(index)
+        if value > 0:
+            bit = ~(1 << value)
+            manual = self._manual
+            for i, j in peers:
+                manual[i][j] &= bit
+        self._emit(peers)
+
+    def refresh(self) -> None:
+        """Marca todas as notas automaticas para recalcular, para quando as
+        possibilidades do Sudoku sao alteradas diretamente (como faz o SudokuSolver)"""
+        self._stale.update(self._all_cells())
+        self._emit(self._all_cells())
+
+    def mask(self, index: Index) -> int:
+        """Mascara das notas exibidas na celula (bit v para o valor v)"""
+        i, j = index
+        if not self._auto:
+            return self._manual[i][j]
+        if index in self._stale:
+            self._stale.discard(index)
+            mask = 0
+            for value in self.sudoku._possibilities[i][j]:
+                mask |= 1 << value
+            self._automatic[i][j] = mask
+        return self._automatic[i][j]
+
+    def values(self, index: Index) -> List[int]:
+        mask = self.mask(index)
+        return [value for value in range(1, self.sudoku.size + 1) if mask >> value & 1]
+
+    def toggle(self, index: Index, value: int) -> None:
+        """Adiciona ou remove uma nota manual"""
+        if 0 < value <= self.sudoku.size:
+            self._manual[index[0]][index[1]] ^= 1 << value
+            if not self._auto:
+                self._emit([index])
+
+    def clear_manual(self) -> None:
+        n = self.sudoku.size
+        self._manual = [[0]*n for _ in range(n)]
+        if not self._auto:
+            self._emit(self._all_cells())
@@ -1,7 +1,13 @@
 from .pygamepages import*
 from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from .sudoku import Sudoku, SudokuSolver, read_sudoku
+from .bank import BANK_DIRECTORY, solution_of
+from .puzzle_pool import PuzzlePool
+from .notes import Notes
 import pygame
+import time
+import os
 
 
 colors = {'white': (255,255,255),
@@ -19,6 +25,13 @@ colors = {'white': (255,255,255),
     'gray_light': (220,220,220),
     'pink_light': (250,180,205)}
 
+# segundos que a resolucao rapida pode levar antes de desistir de um jogo digitado
+SOLVE_TIMEOUT = 5
+solve_status = {'solved': 'Resolvido', 'unsolvable': 'Sem solução', 'timeout': 'Tempo esgotado'}
+
+# jogos prontos para abrir sem ler o banco na hora; o app inicia e encerra a reposicao
+puzzle_pool = PuzzlePool(size=5, source='bank', path=os.path.join(BANK_DIRECTORY, 'pool.json'))
+
 
 example2 = [[0,3,0,0,0,0,0,0,0],
             [0,0,0,0,0,8,0,6,0],
@@ -48,6 +61,7 @@ class Text(Element):
         lines = new_text.split('\n')
         self.surfs = [self._font.render(line, True, self._color) for line in lines]
         self.line_height = self.surfs[0].get_size()[1]
+        self._invalidate()
         
 
 class MyButton(TextButton):
@@ -66,6 +80,7 @@ class MyButton(TextButton):
 class MainMenu(Page):
     def __init__(self):
         super().__init__('MainMenu')
+        self.cached = True
 
         self.background = pygame.Surface(self.size)
         self.background.fill(colors['white'])
@@ -86,6 +101,7 @@ class MainMenu(Page):
 class SelectDifficulty(Page):
     def __init__(self):
         super().__init__('SelectDifficulty')
+        self.cached = True
 
         self.background = pygame.Surface(self.size)
         self.background.fill(colors['white'])
@@ -106,7 +122,8 @@ class SelectDifficulty(Page):
     def select(self, difficulty):
         if difficulty == 'branco':
             PageManager.change_page('GamePage', [[0 for _ in range(9)] for _ in range(9)])
-        PageManager.change_page('GamePage', read_sudoku(difficulty))
+        else:
+            PageManager.change_page('GamePage', puzzle_pool.get(difficulty))
 
     def draw(self):
         self.blit(self.background)
@@ -130,10 +147,37 @@ class SudokuTable(Element):
         self.sudoku = sudoku
         self.cells_to_detach = []
         self.numbers_to_detach = []
-        self.auto_notes = True
         self.note = False
-        self.notes = [[set() for _ in range(9)] for _ in range(9)]
+        self.check = False
+        self.notes = Notes(sudoku, auto=True)
+        self.notes.add_listener(self.on_notes_change)
+        self.notes_surfs = [[None]*9 for _ in range(9)]
+        self.notes_cache = {}
         self.bind(pygame.MOUSEBUTTONDOWN, self.on_click)
+
+    @property
+    def auto_notes(self):
+        return self.notes.auto
+
+    @auto_notes.setter
+    def auto_notes(self, auto):
+        self.notes.auto = auto
+
+    def on_notes_change(self, cells):
+        for i, j in cells:
+            self.notes_surfs[i][j] = None
+
+    def render_notes(self, mask):
+        """Superficie com as notas de uma celula, guardada por mascara"""
+        if not mask in self.notes_cache:
+            step = self.step
+            surf = pygame.Surface((step, step), pygame.SRCALPHA)
+            for number in range(1, 10):
+                if mask >> number & 1:
+                    text = self.font_secondary.render(str(number), True, colors['text_secondary'])
+                    surf.blit(text, (0.12*step + ((number-1)%3)*step*0.3, 0.035*step + ((number-1)//3)*step*0.3))
+            self.notes_cache[mask] = surf
+        return self.notes_cache[mask]
     
     def detach_cell(self, index, color):
         step = self.step
@@ -202,15 +246,17 @@ class SudokuTable(Element):
                     else:
                         self.draw_number((i,j), value, colors['text_primary'], False)
                 else:
-                    if self.auto_notes:
-                        cell = self.sudoku.get_possibilities((i, j))
-                    else:
-                        cell = self.notes[i][j]
-                    for k in cell:
-                        self.draw_number((i,j), k, colors['text_secondary'], True)
+                    surf = self.notes_surfs[i][j]
+                    if surf is None:
+                        surf = self.render_notes(self.notes.mask((i, j)))
+                        self.notes_surfs[i][j] = surf
+                    self.surf.blit(surf, (j*self.step, i*self.step))
         
         for index in self.sudoku.error_cells:
             self.detach_number(index, self.sudoku.get_value(index), colors['red'])
+        if self.check:
+            for index in self.sudoku.wrong_cells:
+                self.detach_number(index, self.sudoku.get_value(index), colors['red'])
 
         for cells, color in self.numbers_to_detach:
             for index, k in cells:
@@ -255,13 +301,9 @@ class SudokuTable(Element):
             self.selected_cell = (int(pos[1]//self.step), int(pos[0]//self.step))
 
     def make_note(self, index, value):
-        notes = self.notes[index[0]][index[1]]
         if self.sudoku.get_value(index) != 0:
             self.sudoku.change_value(index, 0)
-        if value in notes:
-            notes.discard(value)
-        elif value > 0:
-            notes.add(value)
+        self.notes.toggle(index, value)
 
 
 class SudokuPage(Page):
@@ -284,7 +326,6 @@ class SudokuPage(Page):
             else:
                 self.sudoku.reinit(args[0])
             self.table.sudoku = self.sudoku
-            self.table.notes = [[set() for _ in range(9)] for _ in range(9)]
 
     def draw(self):
         self.blit(self.background)
@@ -329,18 +370,61 @@ class GamePage(SudokuPage):
             if label.active and label.on_mouse_focus():
                 but.value = not but.value
                 but.func()
-        self.auto_note_label = Label(self.frame, (0.36*self.frame.width, 0.20*self.frame.height), 'Auto Notas:', 
+        self.auto_note_label = Label(self.frame, (0.36*self.frame.width, 0.12*self.frame.height), 'Auto Notas:', 
                 centralized=True, font_size=25)
-        self.auto_note_but = ButtonOnOff(self.frame, (0.85*self.frame.width, 0.20*self.frame.height), 
+        self.auto_note_but = ButtonOnOff(self.frame, (0.85*self.frame.width, 0.12*self.frame.height), 
             scale=2, centralized=True, func=self.auto_note_change)
         self.bind(pygame.MOUSEBUTTONDOWN, partial(func, self.auto_note_label, self.auto_note_but))
-        self.note_label = Label(self.frame, (0.37*self.frame.width, 0.40*self.frame.height), 'Anotar:', 
+        self.note_label = Label(self.frame, (0.37*self.frame.width, 0.29*self.frame.height), 'Anotar:', 
                 centralized=True, font_size=25)
-        self.note_but = ButtonOnOff(self.frame, (0.73*self.frame.width, 0.40*self.frame.height), 
+        self.note_but = ButtonOnOff(self.frame, (0.73*self.frame.width, 0.29*self.frame.height), 
             scale=2, centralized=True, func=self.note_change)
         self.bind(pygame.MOUSEBUTTONDOWN, partial(func, self.note_label, self.note_but))
-        MyButton(self.frame, (self.frame.width/2, 0.60*self.frame.height), 'Desfazer', self.sudoku.undo)
-        MyButton(self.frame, (self.frame.width/2, 0.80*self.frame.height), 'Resolver', self.solve)
+        self.check_label = Label(self.frame, (0.37*self.frame.width, 0.46*self.frame.height), 'Verificar:', 
+                centralized=True, font_size=25)
+        self.check_but = ButtonOnOff(self.frame, (0.78*self.frame.width, 0.46*self.frame.height), 
+            scale=2, centralized=True, func=self.check_change)
+        self.bind(pygame.MOUSEBUTTONDOWN, partial(func, self.check_label, self.check_but))
+        MyButton(self.frame, (self.frame.width/2, 0.66*self.frame.height), 'Desfazer', self.sudoku.undo)
+        MyButton(self.frame, (self.frame.width/2, 0.86*self.frame.height), 'Resolver', self.solve)
+        self.solved_label = Label(self, (565, 130), 'Resolvido', centralized=True, visible=False)
+        self.hint_solver = SudokuSolver(self.sudoku)
+        self.solution_executor = ThreadPoolExecutor(max_workers=1)
+        self.solution_future = None
+
+    def on_open(self, *args, **kw):
+        super().on_open(*args, **kw)
+        self.clear_hint()
+        if args:
+            self.solution_future = self.solution_executor.submit(solution_of, self.sudoku.values)
+
+    def update(self):
+        """Aplica a solucao calculada em segundo plano e mostra quando o jogo termina"""
+        if self.solution_future is not None and self.solution_future.done():
+            self.sudoku.set_solution(self.solution_future.result())
+            self.solution_future = None
+        solved = self.sudoku.is_solved()
+        if solved != self.solved_label.visible:
+            self.solved_label.visible = solved
+
+    def show_hint(self):
+        """Destaca a deducao mais barata disponivel (tecla H)"""
+        hint = self.hint_solver.next_hint()
+        self.clear_hint()
+        if hint is None:
+            return
+        self.table.cells_to_detach.append((hint['cells'], colors['yellow']))
+        if hint['value'] is not None:
+            self.table.numbers_to_detach.append(([(hint['cells'][0], hint['value'])], colors['red_light']))
+        self.table.numbers_to_detach.append((hint['eliminations'], colors['red_light']))
+
+    def clear_hint(self):
+        self.table.cells_to_detach = []
+        self.table.numbers_to_detach = []
+
+    def numeric_key_down(self, value):
+        self.clear_hint()
+        super().numeric_key_down(value)
 
     def solve(self):
         PageManager.change_page('SelectSolutionPage', self.sudoku)
@@ -351,6 +435,9 @@ class GamePage(SudokuPage):
     def note_change(self):
         self.table.note = not self.table.note
 
+    def check_change(self):
+        self.table.check = not self.table.check
+
     def key_down(self, event):
         if event.key in (pygame.K_LALT, pygame.K_RALT):
             self.table.auto_notes = not self.table.auto_notes
@@ -358,6 +445,8 @@ class GamePage(SudokuPage):
         elif event.key in (pygame.K_RSHIFT, pygame.K_LSHIFT):
             self.table.note = not self.table.note
             self.note_but.value = self.table.note
+        elif event.unicode in ('h', 'H'):
+            self.show_hint()
         else: 
             super().key_down(event)
 
@@ -378,6 +467,7 @@ class SelectSolutionFrame(Frame):
 class SelectSolutionPage(Page):
     def __init__(self):
         super().__init__('SelectSolutionPage')
+        self.cached = True
         self.sudoku = None
 
         self.background = pygame.Surface(self.size)
@@ -427,9 +517,11 @@ class SolverPage(SudokuPage):
         if args[1] == 'step_by_step':
             self.next_step()
         else:
-            self.solver.solve()
+            outcome = self.solver.solve_within(time.monotonic() + SOLVE_TIMEOUT)
             self.solving_frame.visible = False
+            self.solved_label.text = solve_status[outcome['status']]
             self.solved_label.visible = True
+        self.table.notes.refresh()
         self.update_numbers_to_detach()
 
     def draw(self):
@@ -470,16 +562,22 @@ class SolverPage(SudokuPage):
             self.step_info_text.set_text('Faz uma tentativa, caso \nchegue em um erro a tentativa\né trocada')
             self.found_text.text = 'Encontradas: 1'
         else:
-            if self.solver.sudoku.has_error_cells():
+            if self.solver.unsolvable:
+                self.solving_frame.visible = False
+                self.solved_label.text = solve_status['unsolvable']
+                self.solved_label.visible = True
+            elif self.solver.sudoku.has_error_cells():
                 self.step_text.set_text('Erros')
                 self.step_info_text.set_text('Erro implica tentativa errada, \ntroca-se a última tentiva \ndesfazendo as mudanças \nfeitas depois dela')
                 self.found_text.text = ('Encontradas: %d'%(len(set(self.solver.sudoku.error_cells))))
             elif not self.solver.sudoku.has_empty_cells():
                 self.solving_frame.visible = False
+                self.solved_label.text = solve_status['solved']
                 self.solved_label.visible = True
 
     def next_step(self):
         self.solver.step_solve()
+        self.table.notes.refresh()
         self.update_cells_to_detach()
         self.update_numbers_to_detach()
         self.update_step_info()
@@ -493,6 +591,7 @@ class SolverPage(SudokuPage):
 class GeneratorPage(Page):
     def __init__(self):
         super().__init__('GeneratorPage')
+        self.cached = True
         self.background = pygame.Surface(self.size)
         self.background.fill((255,255,255))
         Label(self, (self.width/2, 0.25*self.height), 'Fazendo', centralized=True)
@@ -0,0 +1,169 @@
+"""Busca paralela para um unico jogo.
+
+A arvore de busca e dividida nas primeiras decisoes (a celula com menos
+possibilidades de cada subjogo, nivel a nivel) em subjogos independentes que
+juntos cobrem todas as solucoes. Os subjogos vao para um Pool em tarefas de um
+subjogo cada, varias por worker: quem termina antes pega a proxima da fila, o que
+equilibra a carga quando alguns ramos sao muito maiores que outros. Na contagem os
+resultados sao somados; com limit, cada subjogo tambem para em limit, entao o
+trabalho total pode passar do necessario.
+
+As solucoes sao enumeradas com SolutionStream: cada tarefa continua um subjogo a
+partir do seu cursor, devolve ate chunk solucoes e o cursor novo, que volta para o
+fim da fila. As solucoes chegam aos poucos (sem ordem) mesmo num jogo com poucas
+pistas como o 'branco', e o Pool e encerrado quando limit e atingido ou quando
+quem consome o gerador para:
+
+    parallel_count(grid, workers=4)
+    for solution in parallel_solutions(grid, limit=1000): ...
+
+    python -m src.parallel [workers]   # aceleracao de 1 ate workers processos
+"""
+from typing import List, Dict, Tuple, Optional, Sequence, Iterator, Any
+from multiprocessing import Pool
+from itertools import islice
+import queue
+import os
+
+from .search import Grid, GridSearch, SolutionStream, to_grid
+
+
+TASKS_PER_WORKER = 8
+# solucoes devolvidas por tarefa antes de o subjogo voltar para a fila
+CHUNK_SIZE = 100
+
+Task = Tuple[Grid, Sequence, int]
+
+
+def split(grid: Grid, constraints: Sequence = (), tasks: int = 1) -> List[Grid]:
+    """Divide o jogo em pelo menos tasks subjogos (quando a arvore permite) cujas
+    solucoes, juntas, sao exatamente as do jogo"""
+    frontier = [[value for row in grid for value in row]]
+    while len(frontier) < tasks:
+        expanded, next_frontier = False, []
+        for values in frontier:
+            search = GridSearch(to_grid(values), constraints=constraints)
+            if not search.valid:
+                continue
+            k, candidates = search.choose()
+            if k < 0:
+                next_frontier.append(values)
+                continue
+            expanded = True
+            for value in candidates:
+                child = values.copy()
+                child[k] = value
+                next_frontier.append(child)
+        frontier = next_frontier
+        if not expanded:
+            break
+    return [to_grid(values) for values in frontier]
+
+
+def _count(task: Task) -> int:
+    grid, constraints, limit = task
+    return GridSearch(grid, constraints=constraints).run(limit)
+
+
+def _chunk(task: Tuple[Dict[str, Any], Sequence, int]) -> Tuple[List[Grid], Dict[str, Any]]:
+    """Continua um subjogo do cursor e retorna ate size solucoes e o cursor novo"""
+    cursor, constraints, size = task
+    stream = SolutionStream.from_cursor(cursor, constraints)
+    return list(islice(stream, size)), stream.cursor()
+
+
+def _tasks(grid: Grid, constraints: Sequence, limit: int, workers: int, tasks: Optional[int]) -> List[Task]:
+    subgrids = split(grid, constraints, tasks or TASKS_PER_WORKER*workers)
+    return [(subgrid, constraints, limit) for subgrid in subgrids]
+
+
+def parallel_count(grid: Grid, limit: int = 0, constraints: Sequence = (), workers: Optional[int] = None,
+        tasks: Optional[int] = None) -> int:
+    """Como count_solutions, dividindo a busca entre workers processos"""
+    workers = workers or os.cpu_count() or 1
+    total = 0
+    with Pool(workers) as pool:
+        for count in pool.imap_unordered(_count, _tasks(grid, constraints, limit, workers, tasks)):
+            total += count
+            if limit and total >= limit:
+                return limit
+    return total
+
+
+def parallel_solutions(grid: Grid, limit: int = 0, constraints: Sequence = (),
+        workers: Optional[int] = None, tasks: Optional[int] = None,
+        chunk: int = CHUNK_SIZE) -> Iterator[Grid]:
+    """Gera as solucoes do jogo (no maximo limit, se limit > 0) a medida que os
+    pedacos de cada subjogo ficam prontos"""
+    if limit < 0 or chunk < 1:
+        raise ValueError(f"Invalid limit or chunk: '{limit}', '{chunk}'")
+    workers = workers or os.cpu_count() or 1
+    size = min(chunk, limit) if limit else chunk
+    finished: Any = queue.Queue()
+    found = 0
+    with Pool(workers) as pool:
+        def submit(cursor: Dict[str, Any]) -> None:
+            pool.apply_async(_chunk, ((cursor, constraints, size),), callback=finished.put,
+                    error_callback=finished.put)
+
+        running = 0
+        for subgrid in split(grid, constraints, tasks or TASKS_PER_WORKER*workers):
+            submit(SolutionStream(subgrid, constraints).cursor())
+            running += 1
+        while running:
+            result = finished.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                raise result
+            solutions, cursor = result
+            for solution in solutions:
+                yield solution
+                found += 1
+                if found == limit:
+                    return
+            if not cursor['done']:
+                submit(cursor)
+                running += 1
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    import random
+    from .sudoku import read_sudoku
+    from .search import random_full_grid
+    from .variants import Diagonal
+
+    rng = random.Random(3)
+    open_grid = random_full_grid(rng)
+    for cell in rng.sample(range(81), 58):
+        open_grid[cell//9][cell%9] = 0
+    cases = [
+        ('23 pistas, todas', open_grid, (), 0),
+        ('expert 0, todas', read_sudoku('expert', 0), (), 0),
+        ('diagonal, 20000', [[0]*9 for _ in range(8)] + [list(range(1, 10))], (Diagonal(),), 20000),
+        ('branco, 20000', [[0]*9 for _ in range(9)], (), 20000),
+    ]
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count() or 1
+    for name, grid, constraints, limit in cases:
+        start = time.perf_counter()
+        expected = GridSearch(grid, constraints=constraints).run(limit)
+        serial = time.perf_counter() - start
+        print(f'{name:<20} {expected:>8} solucoes  serial {serial:7.2f} s')
+        for workers in range(1, max_workers + 1):
+            start = time.perf_counter()
+            count = parallel_count(grid, limit, constraints, workers)
+            elapsed = time.perf_counter() - start
+            assert count == expected
+            print(f'{"":<20} {workers:>3} workers {elapsed:7.2f} s  aceleracao {serial/elapsed:5.2f}x')
+
+    blank = [[0]*9 for _ in range(9)]
+    start = time.perf_counter()
+    solutions = parallel_solutions(blank, workers=max_workers)
+    next(solutions)
+    first = time.perf_counter() - start
+    for _ in islice(solutions, 9999):
+        pass
+    solutions.close()
+    print(f'branco, streaming     primeira solucao {first:5.2f} s  10000 solucoes '
+            f'{time.perf_counter() - start:5.2f} s')
@@ -0,0 +1,218 @@
+"""Portfolio de motores: resolve o mesmo jogo com varias estrategias em processos
+separados, fica com a primeira resposta e encerra as demais.
+
+Nenhuma estrategia e a melhor em todos os jogos: o SudokuSolver (tecnicas humanas),
+a busca com mascaras (GridSearch), o DPLL sobre a codificacao CNF e buscas
+aleatorias com reinicios e sementes diferentes erram feio em jogos diferentes.
+O Portfolio guarda quantas vezes cada estrategia venceu e, quando ha menos workers
+que estrategias, comeca pelas que mais venceram:
+
+    portfolio = Portfolio(workers=3)
+    result = portfolio.solve(grid)   # {'solution': ..., 'strategy': 'search', 'elapsed': ...}
+    portfolio.recommended_order()
+
+    python -m src.portfolio [dificuldades...]   # compara com cada estrategia sozinha
+"""
+from typing import List, Dict, Tuple, Optional, Sequence, Callable, Any
+from functools import partial
+import multiprocessing
+import queue
+import random
+import time
+import os
+
+from .sudoku import SudokuSolver
+from .search import Grid, GridSearch, solve_grid, to_grid
+
+
+Strategy = Callable[[Grid, Sequence], Optional[Grid]]
+
+
+class _Restart(Exception):
+    pass
+
+
+class BudgetedSearch(GridSearch):
+    """GridSearch que desiste (levanta _Restart) depois de visitar budget nos"""
+    def __init__(self, grid: Grid, rng: Optional[random.Random] = None, constraints: Sequence = (),
+            budget: int = 0):
+        super().__init__(grid, rng, constraints)
+        self.budget = budget
+        self.nodes = 0
+
+    def _search(self) -> bool:
+        self.nodes += 1
+        if self.budget and self.nodes > self.budget:
+            raise _Restart()
+        return super()._search()
+
+
+def restart_search(grid: Grid, constraints: Sequence = (), seed: int = 0,
+        first_budget: int = 200) -> Optional[Grid]:
+    """Busca com valores em ordem aleatoria que recomeca com outra ordem (e o dobro
+    do orcamento de nos) sempre que o orcamento acaba, para sair de ramos azarados"""
+    rng = random.Random(seed)
+    budget = first_budget
+    while True:
+        search = BudgetedSearch(grid, rng, constraints, budget)
+        try:
+            search.run(1)
+        except _Restart:
+            budget *= 2
+            continue
+        return None if search.solution is None else to_grid(search.solution)
+
+
+def human_solve(grid: Grid, constraints: Sequence = ()) -> Optional[Grid]:
+    """None quando o solver prova que o jogo nao tem solucao; se ele parar sem uma
+    grade completa e sem erros levanta RuntimeError, o que conta como falha no Portfolio"""
+    solver = SudokuSolver(grid, constraints)
+    outcome = solver.solve_within()
+    if outcome['status'] == 'unsolvable':
+        return None
+    if outcome['status'] != 'solved' or solver.sudoku.has_empty_cells() or solver.sudoku.has_error_cells():
+        raise RuntimeError('Solver stopped without a solution')
+    return outcome['values']
+
+
+def sat_solve(grid: Grid, constraints: Sequence = ()) -> Optional[Grid]:
+    from .cnf import sat_solutions
+    solutions = sat_solutions(grid, constraints, 1)
+    return solutions[0] if solutions else None
+
+
+STRATEGIES: Dict[str, Strategy] = {
+    'search': solve_grid,
+    'solver': human_solve,
+    'restart-1': partial(restart_search, seed=1),
+    'restart-2': partial(restart_search, seed=2),
+    'sat': sat_solve,
+}
+
+
+# intervalo (s) entre as verificacoes de processos que terminaram sem responder
+POLL_INTERVAL = 0.1
+
+
+def _race(name: str, grid: Grid, constraints: Sequence, results: Any) -> None:
+    """Coloca na fila (estrategia, solucao, erro); erro e o repr da excecao, se houver"""
+    try:
+        results.put((name, STRATEGIES[name](grid, constraints), None))
+    except Exception as e:
+        results.put((name, None, repr(e)))
+
+
+class Portfolio:
+    """Corre as estrategias em processos e fica com a primeira que responder.
+    solution None com strategy definida quer dizer que o jogo nao tem solucao;
+    strategy None quer dizer que nenhuma respondeu antes do timeout. Se todas
+    falharem (com excecao ou encerradas sem resposta) levanta ValueError"""
+    def __init__(self, strategies: Optional[Sequence[str]] = None, workers: Optional[int] = None,
+            timeout: Optional[float] = None):
+        self.strategies = list(STRATEGIES if strategies is None else strategies)
+        for name in self.strategies:
+            if not name in STRATEGIES:
+                raise ValueError(f"Invalid strategy: '{name}'")
+        self.workers = workers or min(len(self.strategies), os.cpu_count() or 1)
+        self.timeout = timeout
+        self.wins: Dict[str, int] = {name: 0 for name in self.strategies}
+        self.win_time: Dict[str, float] = {name: 0.0 for name in self.strategies}
+
+    def recommended_order(self) -> List[str]:
+        """Estrategias da que mais venceu para a que menos venceu (empate pelo menor
+        tempo medio nas vitorias, depois pela ordem original)"""
+        def key(name: str):
+            wins = self.wins[name]
+            return (-wins, self.win_time[name]/wins if wins else 0.0, self.strategies.index(name))
+        return sorted(self.strategies, key=key)
+
+    def solve(self, grid: Grid, constraints: Sequence = ()) -> Dict[str, Any]:
+        start = time.perf_counter()
+        results: Any = multiprocessing.Queue()
+        names = self.recommended_order()[:self.workers]
+        processes = [multiprocessing.Process(target=_race, args=(name, grid, constraints, results),
+                daemon=True) for name in names]
+        for process in processes:
+            process.start()
+        try:
+            strategy, solution, errors = self._first_answer(names, processes, results, start)
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+            for process in processes:
+                process.join()
+            results.close()
+
+        elapsed = time.perf_counter() - start
+        if len(errors) == len(names):
+            raise ValueError('All strategies failed: ' + ', '.join(f'{name}: {error}'
+                    for name, error in errors.items()))
+        if strategy is not None:
+            self.wins[strategy] += 1
+            self.win_time[strategy] += elapsed
+        return {'solution': solution, 'strategy': strategy, 'elapsed': elapsed}
+
+    def _first_answer(self, names: List[str], processes: List[Any], results: Any,
+            start: float) -> Tuple[Optional[str], Optional[Grid], Dict[str, str]]:
+        """Espera a primeira estrategia que responder sem erro, ate o timeout ou ate
+        todas terem falhado; retorna a estrategia, a solucao e os erros"""
+        errors: Dict[str, str] = {}
+        while len(errors) < len(names):
+            wait = POLL_INTERVAL
+            if self.timeout is not None:
+                wait = min(wait, start + self.timeout - time.perf_counter())
+                if wait <= 0:
+                    break
+            try:
+                name, solution, error = results.get(timeout=wait)
+            except queue.Empty:
+                for name, process in zip(names, processes):
+                    # so conta como falha depois de esvaziar a fila: quem respondeu
+                    # e terminou em seguida ja deixou a resposta no pipe
+                    if not process.is_alive() and not name in errors and results.empty():
+                        errors[name] = f'exit code {process.exitcode}'
+                continue
+            if error is None:
+                return name, solution, errors
+            errors[name] = error
+        return None, None, errors
+
+
+def solve_portfolio(grid: Grid, constraints: Sequence = (), timeout: Optional[float] = None) -> Optional[Grid]:
+    return Portfolio(timeout=timeout).solve(grid, constraints)['solution']
+
+
+if __name__ == '__main__':
+    import sys
+    from .sudoku import Sudoku, read_sudoku
+    from .generator import dig
+    from .search import random_full_grid
+
+    rng = random.Random(7)
+    difficulties = sys.argv[1:] or ['dificil', 'expert']
+    grids = [read_sudoku(difficulty, i) for difficulty in difficulties for i in range(15)]
+    grids += [dig(random_full_grid(rng), 17, rng) for _ in range(15)]
+    # feito contra o backtracking ingenuo: a primeira linha nao tem pistas
+    grids.append(Sudoku.from_string(
+            '..............3.85..1.2.......5.7.....4...1...9.......5......73..2.1........4...9').values)
+
+    def percentiles(times: List[float]) -> str:
+        times = sorted(times)
+        p50, p99 = times[len(times)//2], times[min(len(times) - 1, int(len(times)*0.99))]
+        return f'p50 {1000*p50:8.1f} ms  p99 {1000*p99:8.1f} ms  total {sum(times):6.2f} s'
+
+    for name, strategy in STRATEGIES.items():
+        times = []
+        for grid in grids:
+            start = time.perf_counter()
+            strategy(grid, ())
+            times.append(time.perf_counter() - start)
+        print(f'{name:<12}{percentiles(times)}')
+
+    portfolio = Portfolio()
+    print(f'{portfolio.workers} workers')
+    times = [portfolio.solve(grid)['elapsed'] for grid in grids]
+    print(f"{'portfolio':<12}{percentiles(times)}")
+    print('vitorias', portfolio.wins)
+    print('ordem recomendada', portfolio.recommended_order())
@@ -0,0 +1,120 @@
+"""Instrumentacao opcional do Sudoku e do SudokuSolver.
+
+Os metodos medidos sao substituidos apenas nas instancias anexadas ao Profiler,
+entao quando ele nao esta em uso o codigo roda sem custo nenhum.
+
+    profiler = Profiler()
+    solver = SudokuSolver(read_sudoku('expert', 0))
+    with profiler.attach(solver):
+        solver.solve()
+    print(profiler.to_json())
+    profiler.write_collapsed('expert.folded')  # flamegraph.pl / speedscope
+
+    python -m src.profiling expert
+"""
+from typing import List, Dict, Any, Union, Optional, Callable, Iterator
+from contextlib import contextmanager
+import functools
+import json
+import time
+
+from .sudoku import Sudoku, SudokuSolver, read_sudoku
+
+
+SOLVER_METHODS = ['solve', 'step_solve', 'check_solved_cells', 'check_singles',
+    'check_double_pairs', 'make_attempt', 'change_attempt']
+SUDOKU_METHODS = ['change_value', 'undo']
+BACKTRACK_METHODS = ['make_attempt', 'change_attempt']
+
+
+class Profiler:
+    def __init__(self):
+        self.calls: Dict[str, int] = {}
+        self.total_ns: Dict[str, int] = {}
+        self.self_ns: Dict[str, int] = {}
+        self.depths: Dict[int, int] = {}
+        self._stack: List[List[Any]] = []
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def _wrap(self, name: str, method: Callable, solver: Optional[SudokuSolver] = None) -> Callable:
+        @functools.wraps(method)
+        def wrapper(*args, **kw):
+            stack = self._stack
+            path = stack[-1][0] + ';' + name if stack else name
+            frame = [path, 0]
+            stack.append(frame)
+            start = time.perf_counter_ns()
+            try:
+                return method(*args, **kw)
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                stack.pop()
+                if stack:
+                    stack[-1][1] += elapsed
+                self.calls[name] = self.calls.get(name, 0) + 1
+                self.total_ns[name] = self.total_ns.get(name, 0) + elapsed
+                self.self_ns[path] = self.self_ns.get(path, 0) + elapsed - frame[1]
+                if solver is not None:
+                    depth = len(solver.attempts)
+                    self.depths[depth] = self.depths.get(depth, 0) + 1
+        return wrapper
+
+    @contextmanager
+    def attach(self, target: Union[Sudoku, SudokuSolver]) -> Iterator['Profiler']:
+        """Instrumenta a instancia (e o sudoku do solver) enquanto o contexto estiver aberto"""
+        patched = []
+        if isinstance(target, SudokuSolver):
+            for name in SOLVER_METHODS:
+                solver = target if name in BACKTRACK_METHODS else None
+                setattr(target, name, self._wrap(name, getattr(target, name), solver))
+                patched.append((target, name))
+            sudoku = target.sudoku
+        else:
+            sudoku = target
+        for name in SUDOKU_METHODS:
+            setattr(sudoku, name, self._wrap(name, getattr(sudoku, name)))
+            patched.append((sudoku, name))
+        try:
+            yield self
+        finally:
+            for obj, name in patched:
+                delattr(obj, name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'functions': {name: {
+                'calls': calls,
+                'total_ms': self.total_ns[name]/1_000_000,
+                'mean_us': self.total_ns[name]/calls/1000,
+            } for name, calls in sorted(self.calls.items(), key=lambda item: -self.total_ns[item[0]])},
+            'backtrack_depth': {str(depth): count for depth, count in sorted(self.depths.items())},
+        }
+
+    def to_json(self, path: Optional[str] = None) -> str:
+        text = json.dumps(self.to_dict(), indent=2)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(text)
+        return text
+
+    def collapsed(self) -> str:
+        """Pilhas no formato 'a;b;c valor' com o tempo proprio de cada pilha em microssegundos"""
+        return '\n'.join(f'{path} {ns//1000}' for path, ns in sorted(self.self_ns.items())) + '\n'
+
+    def write_collapsed(self, path: str) -> None:
+        with open(path, 'w') as f:
+            f.write(self.collapsed())
+
+
+if __name__ == '__main__':
+    import sys
+    difficulty = sys.argv[1] if len(sys.argv) > 1 else 'expert'
+    profiler = Profiler()
+    for i in range(15):
+        solver = SudokuSolver(read_sudoku(difficulty, i))
+        with profiler.attach(solver):
+            solver.solve()
+    print(profiler.to_json())
+    profiler.write_collapsed(difficulty + '.folded')
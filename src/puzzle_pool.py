@@ -0,0 +1,233 @@
+"""Reserva de jogos prontos por dificuldade, reposta em segundo plano.
+
+Abrir um jogo pega um da reserva na hora (um acerto); se a reserva da dificuldade
+estiver vazia (uma falha), o jogo vem do banco ja em memoria. Uma thread repoe as
+reservas abaixo de size a partir do banco ou do gerador (este num processo
+separado, para nao disputar o GIL com a interface); antes de repor, ela le os
+arquivos do banco, e uma falha nesse intervalo espera essa leitura terminar, para
+que as falhas nao leiam o disco na thread da interface (sem start, a falha le o
+banco na hora).
+A reserva e gravada em JSON a cada reposicao e lida de novo ao criar o PuzzlePool:
+
+    pool = PuzzlePool(size=5, source='generator', path='games/pool.json')
+    pool.start()
+    grid = pool.get('medio')
+    pool.metrics()   # acertos, falhas e tempo das reposicoes
+    pool.stop()
+
+    python -m src.puzzle_pool [bank|generator]
+"""
+from typing import List, Dict, Optional, Callable, Any
+from collections import deque
+from multiprocessing import Pool, TimeoutError as PoolTimeoutError
+import threading
+import json
+import time
+import os
+
+from .search import Grid
+from .generator import DIFFICULTIES, generate
+from .bank import load_bank, read_puzzle
+
+
+# intervalo (s) entre as verificacoes de stop enquanto o gerador trabalha
+POLL_INTERVAL = 0.1
+
+
+def _from_bank(difficulty: str) -> Grid:
+    return read_puzzle(difficulty)['grid']
+
+
+def _from_generator(difficulty: str) -> Grid:
+    return generate(difficulty)
+
+
+SOURCES: Dict[str, Callable[[str], Grid]] = {
+    'bank': _from_bank,
+    'generator': _from_generator,
+}
+
+
+class PuzzlePool:
+    def __init__(self, size: int = 5, source: str = 'bank', path: Optional[str] = None,
+            difficulties: Optional[List[str]] = None):
+        if not source in SOURCES:
+            raise ValueError(f"Invalid source: '{source}'")
+        self.size = size
+        self.source = source
+        self.path = path
+        self.difficulties = list(difficulties or DIFFICULTIES)
+        self._puzzles: Dict[str, deque] = {difficulty: deque() for difficulty in self.difficulties}
+        self._condition = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[Any] = None
+        self._preloaded = threading.Event()
+        self._stopping = False
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self.refill_ms = {'count': 0, 'total': 0.0, 'max': 0.0}
+        if path is not None:
+            self.load()
+
+    def load(self) -> None:
+        """Le a reserva gravada; um arquivo ausente ou invalido e ignorado"""
+        try:
+            with open(self.path, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        with self._condition:
+            for difficulty, grids in saved.items():
+                if difficulty in self._puzzles and isinstance(grids, list):
+                    self._puzzles[difficulty].extend(grids[:self.size])
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self._condition:
+            saved = {difficulty: list(grids) for difficulty, grids in self._puzzles.items()}
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(saved, f)
+        os.replace(temporary, self.path)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._preloaded.clear()
+            if self.source == 'generator':
+                self._pool = Pool(1)
+            self._thread = threading.Thread(target=self._refill_loop, daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Encerra a reposicao sem esperar o gerador terminar o jogo em andamento"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
+        self.save()
+
+    def ready(self, difficulty: str) -> int:
+        with self._condition:
+            return len(self._puzzles[difficulty])
+
+    def get(self, difficulty: str) -> Grid:
+        """Retorna um jogo sem esperar pela reposicao; uma falha logo apos start
+        espera apenas a leitura inicial do banco"""
+        with self._condition:
+            grids = self._puzzles[difficulty]
+            grid = grids.popleft() if grids else None
+            if grid is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self._condition.notify_all()
+        if grid is not None:
+            return grid
+        if self._thread is not None:
+            self._preloaded.wait()
+        return _from_bank(difficulty)
+
+    def _next_to_refill(self) -> Optional[str]:
+        """Dificuldade com a menor reserva abaixo de size, ou None se todas estao cheias"""
+        difficulty = min(self.difficulties, key=lambda difficulty: len(self._puzzles[difficulty]))
+        return difficulty if len(self._puzzles[difficulty]) < self.size else None
+
+    def _produce(self, difficulty: str) -> Optional[Grid]:
+        """Um jogo novo da fonte, ou None se stop foi chamado enquanto o gerador trabalhava"""
+        if self._pool is None:
+            return SOURCES[self.source](difficulty)
+        result = self._pool.apply_async(SOURCES[self.source], (difficulty,))
+        while not self._stopping:
+            try:
+                return result.get(POLL_INTERVAL)
+            except PoolTimeoutError:
+                pass
+        return None
+
+    def _preload(self) -> None:
+        """Le os bancos para a memoria; sinaliza _preloaded mesmo se parar no meio"""
+        try:
+            for difficulty in self.difficulties:
+                if self._stopping:
+                    return
+                try:
+                    load_bank(difficulty)
+                except OSError:
+                    pass
+        finally:
+            self._preloaded.set()
+
+    def _refill_loop(self) -> None:
+        self._preload()
+        while True:
+            with self._condition:
+                while not self._stopping and self._next_to_refill() is None:
+                    self._condition.wait()
+                if self._stopping:
+                    return
+                difficulty = self._next_to_refill()
+
+            start = time.perf_counter()
+            try:
+                grid = self._produce(difficulty)
+            except Exception:
+                with self._condition:
+                    self.errors += 1
+                    if self._stopping:
+                        return
+                    self._condition.wait(1)
+                continue
+            if grid is None:
+                return
+            elapsed = 1000*(time.perf_counter() - start)
+
+            with self._condition:
+                self._puzzles[difficulty].append(grid)
+                self.refill_ms['count'] += 1
+                self.refill_ms['total'] += elapsed
+                self.refill_ms['max'] = max(self.refill_ms['max'], elapsed)
+            self.save()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'errors': self.errors,
+                'refill_ms': dict(self.refill_ms),
+                'ready': {difficulty: len(grids) for difficulty, grids in self._puzzles.items()},
+            }
+
+
+if __name__ == '__main__':
+    import sys
+    import tempfile
+
+    source = sys.argv[1] if len(sys.argv) > 1 else 'bank'
+    path = os.path.join(tempfile.gettempdir(), 'sudoku_pool.json')
+    if os.path.exists(path):
+        os.remove(path)
+    pool = PuzzlePool(size=3, source=source, path=path)
+    pool.start()
+    for difficulty in pool.difficulties:
+        start = time.perf_counter()
+        pool.get(difficulty)
+        print(f'{difficulty:<8} primeiro get {1000*(time.perf_counter() - start):8.3f} ms')
+    while any(pool.ready(difficulty) < pool.size for difficulty in pool.difficulties):
+        time.sleep(0.05)
+    for difficulty in pool.difficulties:
+        start = time.perf_counter()
+        pool.get(difficulty)
+        print(f'{difficulty:<8} get da reserva {1000*(time.perf_counter() - start):6.3f} ms')
+    pool.stop()
+    print(pool.metrics())
+    print('gravado:', {difficulty: PuzzlePool(path=path).ready(difficulty) for difficulty in pool.difficulties})
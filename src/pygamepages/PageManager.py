@@ -1,6 +1,6 @@
 import pygame
 from pygame import Surface, Vector2
-from typing import NewType, List, Callable, Any
+from typing import NewType, List, Dict, Callable, Any, Optional
 
 
 class Page:
@@ -18,8 +18,10 @@ class Page:
 
 EventType = NewType('EventType', int)
 _screen: Surface
-_current_page: Page
+_origin: Vector2 = Vector2(0, 0)
+_current_page: Optional[Page] = None
 _pages: List[Page] = []
+_factories: Dict[str, Callable[[], Page]] = {}
 NUMBER_EVENT_TYPES = 7
 
 def init(surf) -> None:
@@ -30,13 +32,23 @@ def __find_page(tag) -> int:
     for i, page in enumerate(_pages):
         if page.tag == tag:
             return i
+    if tag in _factories:
+        _factories.pop(tag)()
+        return len(_pages) - 1
     raise Exception('Page not found')
 
 def _add_page(page: Page) -> None:
     _pages.append(page)
-    if len(_pages) == 1:
+    if _current_page is None:
         __set_start_page(page.tag)
 
+def register(tag: str, factory: Callable[[], Page]) -> None:
+    """Registra uma pagina que so sera construida ao ser aberta pela primeira vez.
+    A primeira pagina registrada e construida imediatamente como pagina inicial"""
+    _factories[tag] = factory
+    if _current_page is None and not _pages:
+        __find_page(tag)
+
 def __set_start_page(tag: str, *args, **kw) -> None:
     global _current_page
     _current_page = _pages[__find_page(tag)]
@@ -2,7 +2,7 @@ import pygame
 from pygame import Vector2, Surface
 from . import PageManager
 from .PageManager import EventType
-from typing import Union, Tuple, List, Callable, Optional, Any
+from typing import Union, Tuple, List, Callable, Optional, Any, Dict, Set
 
 Color = Union[Tuple[int, int, int], Tuple[int, int, int, int]]
 Coordinate = Union[Vector2, Tuple[float, float]]
@@ -19,15 +19,67 @@ def rect_fit(vec: Coordinate, rect_size: Coordinate) -> bool:
     return False
 
 
+class SpatialIndex:
+    """Grade uniforme que associa cada regiao da tela aos elementos que a ocupam,
+    permitindo responder qual elemento esta sob o mouse com uma unica consulta"""
+    def __init__(self, cell_size: int = 64):
+        self._cell_size = cell_size
+        self._cells: Dict[Tuple[int, int], Set['BaseElement']] = {}
+        self._rects: Dict['BaseElement', Tuple[float, float, float, float]] = {}
+        self._last_point: Optional[Tuple[float, float]] = None
+        self._last_hits: Set['BaseElement'] = set()
+
+    def _cells_of(self, rect: Tuple[float, float, float, float]) -> List[Tuple[int, int]]:
+        x, y, w, h = rect
+        size = self._cell_size
+        return [(i, j) for i in range(int(x//size), int((x + w)//size) + 1)
+                for j in range(int(y//size), int((y + h)//size) + 1)]
+
+    def update(self, elt: 'BaseElement', pos: Coordinate, size: Coordinate) -> None:
+        """Atualiza o retangulo ocupado pelo elemento"""
+        rect = (pos[0], pos[1], size[0], size[1])
+        if self._rects.get(elt) == rect:
+            return
+        self.remove(elt)
+        self._rects[elt] = rect
+        for cell in self._cells_of(rect):
+            self._cells.setdefault(cell, set()).add(elt)
+
+    def remove(self, elt: 'BaseElement') -> None:
+        rect = self._rects.pop(elt, None)
+        if rect is not None:
+            for cell in self._cells_of(rect):
+                self._cells[cell].discard(elt)
+        self._last_point = None
+
+    def query(self, point: Coordinate) -> Set['BaseElement']:
+        """Retorna os elementos cujo retangulo contem o ponto"""
+        point = (point[0], point[1])
+        if point == self._last_point:
+            return self._last_hits
+        size = self._cell_size
+        hits = set()
+        for elt in self._cells.get((int(point[0]//size), int(point[1]//size)), ()):
+            x, y, w, h = self._rects[elt]
+            if rect_fit((point[0] - x, point[1] - y), (w, h)):
+                hits.add(elt)
+        self._last_point = point
+        self._last_hits = hits
+        return hits
+
+
 class BaseElement:
+    _page: 'Page'
     _page_tag: str
+    _parent: Optional['BaseFrame']
     _pos: Vector2
     _parent_pos: Vector2
     _actual_pos: Vector2
     _size: Vector2
     _centralized: bool
     _active: bool
-    visible: bool
+    _visible: bool
+    _dirty: bool = True
 
     def config(self, **kw):
         for key, val in kw.items():
@@ -44,6 +96,21 @@ class BaseElement:
             self._actual_pos = self._parent_pos + self.pos - self.size/2
         else:
             self._actual_pos = self._parent_pos + self.pos
+        self._update_hit_rect()
+        self._invalidate()
+
+    def _update_hit_rect(self):
+        self._page._spatial_index.update(self, self._actual_pos, self._size)
+
+    def _invalidate(self):
+        """Marca o elemento e seus ancestrais para serem recompostos no proximo desenho"""
+        elt = self
+        while elt is not None:
+            elt._dirty = True
+            elt = elt._parent
+
+    def invalidate(self):
+        self._invalidate()
 
     @property
     def active(self) -> bool:
@@ -53,6 +120,16 @@ class BaseElement:
     def active(self, new_value: bool) -> None:
         self._active = new_value
 
+    @property
+    def visible(self) -> bool:
+        return self._visible
+
+    @visible.setter
+    def visible(self, new_value: bool) -> None:
+        if getattr(self, '_visible', None) != new_value:
+            self._visible = new_value
+            self._invalidate()
+
     @property
     def pos(self) -> Vector2: 
         return self._pos
@@ -94,6 +171,7 @@ class BaseElement:
     @width.setter
     def width(self, new_width: float):
         self._size.x = new_width
+        self._update_hit_rect()
 
     @property
     def height(self) -> float:
@@ -102,6 +180,7 @@ class BaseElement:
     @height.setter
     def height(self, new_height: float):
         self._size.y = new_height
+        self._update_hit_rect()
 
     @property
     def center(self) -> Vector2:
@@ -111,10 +190,11 @@ class BaseElement:
         PageManager.bind(event_type, func, self._page_tag)
 
     def blit(self, surf: Surface, pos: Coordinate = Vector2(0, 0), centralized: bool = False):
+        actual_pos = self._actual_pos - PageManager._origin
         if centralized:
-            PageManager._screen.blit(surf, self._actual_pos + pos + self.center - Vector2(surf.get_size())/2)
+            PageManager._screen.blit(surf, actual_pos + pos + self.center - Vector2(surf.get_size())/2)
         else:
-            PageManager._screen.blit(surf, self._actual_pos + pos)
+            PageManager._screen.blit(surf, actual_pos + pos)
 
     def _update(self):
         pass
@@ -126,11 +206,16 @@ class BaseElement:
         return Vector2(pygame.mouse.get_pos()) - self._actual_pos
 
     def on_mouse_focus(self) -> bool:
-        return rect_fit(self.mouse_pos(), self._size)
+        return self in self._page.hit_test(pygame.mouse.get_pos())
 
 
 class BaseFrame(BaseElement):
+    """Com cached=True a arvore de elementos e composta uma unica vez numa superficie
+    fora da tela, que so e refeita quando algum elemento e invalidado (texto, posicao
+    ou visibilidade). Elementos que desenham estado externo devem chamar invalidate()"""
     _elements: List[BaseElement]
+    cached: bool = False
+    _cache_surf: Optional[Surface] = None
 
     @property
     def active(self) -> bool:
@@ -160,10 +245,32 @@ class BaseFrame(BaseElement):
 
     def _draw(self):
         if self.visible:
-            self.draw()
-            for elt in self._elements:
-                if elt.visible:
-                    elt._draw()
+            if self.cached:
+                if self._dirty or self._cache_surf is None:
+                    self._composite()
+                PageManager._screen.blit(self._cache_surf, self._actual_pos - PageManager._origin)
+            else:
+                self._draw_elements()
+
+    def _draw_elements(self):
+        self.draw()
+        for elt in self._elements:
+            if elt.visible:
+                elt._draw()
+
+    def _composite(self):
+        size = vec2int(self._size)
+        if self._cache_surf is None or self._cache_surf.get_size() != size:
+            self._cache_surf = Surface(size, pygame.SRCALPHA)
+        self._cache_surf.fill((0, 0, 0, 0))
+
+        screen, origin = PageManager._screen, PageManager._origin
+        PageManager._screen, PageManager._origin = self._cache_surf, Vector2(self._actual_pos)
+        try:
+            self._draw_elements()
+        finally:
+            PageManager._screen, PageManager._origin = screen, origin
+        self._dirty = False
 
     def draw(self):
         pass
@@ -172,11 +279,13 @@ class BaseFrame(BaseElement):
 class Element(BaseElement):
     def __init__(self, parent: BaseFrame, pos: Coordinate, size: Coordinate, **kw):
         self._pos: Vector2
-        self._size: Vector2
+        self._size: Vector2 = Vector2(1, 1)
         self._actual_pos: Vector2
         self._active: bool = True
         self._centralized: bool = False
         self._parent_pos: Vector2 = parent._actual_pos
+        self._parent: Optional[BaseFrame] = parent
+        self._page: Page = parent._page
         self._page_tag: str = parent._page_tag
 
         self.visible: bool = True
@@ -218,7 +327,10 @@ class Frame(BaseFrame, Element):
 class Page(BaseFrame):
     def __init__(self, tag: str):
         self._tag: str = tag
+        self._page = self
         self._page_tag = tag
+        self._parent = None
+        self._spatial_index = SpatialIndex()
         self._actual_pos = Vector2(0, 0)
         self._size = Vector2(PageManager._screen.get_size())
         self._active = True
@@ -235,7 +347,17 @@ class Page(BaseFrame):
         return self._tag
 
     def blit(self, surf: pygame.Surface, pos: Coordinate = Vector2(0,0)):
-        PageManager._screen.blit(surf, pos)
+        PageManager._screen.blit(surf, Vector2(pos) - PageManager._origin)
+
+    def _update_hit_rect(self):
+        pass
+
+    def on_mouse_focus(self) -> bool:
+        return rect_fit(self.mouse_pos(), self._size)
+
+    def hit_test(self, pos: Coordinate) -> Set[BaseElement]:
+        """Retorna os elementos da pagina sob a posicao (coordenadas da tela)"""
+        return self._spatial_index.query(pos)
 
     def on_open(self, *args, **kw):
         pass
@@ -264,6 +386,9 @@ class Widget(Element):
     
     @background_color.setter
     def background_color(self, new_color: Color):
+        if (new_color == self._background_color and self._background_surf
+                and self._background_surf.get_size() == vec2int(self.size)):
+            return
         self._background_color = new_color
         if not self._background_image: 
             if not new_color is None:
@@ -271,6 +396,7 @@ class Widget(Element):
                 self._background_surf.fill(new_color[:3])
                 if len(new_color) == 4:
                     self._background_surf.set_alpha(new_color[3])
+        self._invalidate()
     
     @property
     def background_image(self) -> Optional[Surface]:
@@ -282,6 +408,7 @@ class Widget(Element):
         self._background_surf = new_image
         if not rect_fit(new_image.get_size(), self.size):
             self.size = new_image.get_size()
+        self._invalidate()
 
     @property
     def size(self) -> Vector2: 
@@ -329,6 +456,7 @@ class Label(Widget):
                 self.size = txt_size
         except:
             raise Exception('Invalid text')
+        self._invalidate()
 
     @property
     def font(self) -> str:
@@ -459,6 +587,7 @@ class Slider(Widget):
         if self._sliding:
             mouse_pos = self.mouse_pos()
             self._value = max(0, min(self._bar_width - 15*self.scale, mouse_pos[0] - int(7.5*self.scale)))
+            self._invalidate()
 
     def draw(self):
         self.blit(self._bar, (0, 10*self.scale))
@@ -492,6 +621,7 @@ class ButtonOnOff(Widget):
     @value.setter
     def value(self, new_value: bool) -> None:
         self._value = new_value
+        self._invalidate()
 
     @property
     def scale(self) -> float:
@@ -514,6 +644,6 @@ class ButtonOnOff(Widget):
         
     def on_click(self, event):
         if self.active and self.on_mouse_focus():
-            self._value = not self._value
+            self.value = not self._value
             self._func()
 
@@ -0,0 +1,247 @@
+"""Amostragem rapida de grades completas.
+
+Uma grade base vem da busca aleatoria (random_full_grid) e cada amostra aplica a ela
+transformacoes que preservam a validade: troca dos digitos, permutacao das faixas e
+das pilhas de caixas, das linhas dentro de cada faixa, das colunas dentro de cada
+pilha e transposicao. Sorteando cada parte uniformemente, a amostra e uniforme entre
+as grades equivalentes a base; a base e trocada a cada reseed amostras, o que mistura
+as classes de equivalencia (sem tornar a amostra exatamente uniforme entre todas as
+grades, o que exigiria um sorteio bem mais caro). Vale so para o sudoku classico:
+as transformacoes nao preservam as restricoes das variantes.
+
+    sampler = GridSampler(seed=1)
+    sampler.sample()                                  # Grid
+    for batch in sampler.batches(100000): ...         # bytes, n*n bytes por grade
+    for batch in sampler.batches(100000, as_numpy=True): ...   # array (linhas, n*n) uint8
+
+    python -m src.sampler [quantidade]   # velocidade e teste de cobertura
+"""
+from typing import List, Dict, Tuple, Optional, Iterator, Any
+from functools import lru_cache
+from itertools import permutations, product
+from operator import itemgetter
+import random
+import math
+
+from .search import Grid, random_full_grid, to_grid
+
+
+Transform = Tuple[List[int], List[int], bool, List[int]]
+
+
+@lru_cache(maxsize=None)
+def line_orders(box_size: int) -> List[List[int]]:
+    """Todas as ordens de linhas (ou colunas) que preservam a validade: as faixas em
+    qualquer ordem e as linhas de cada faixa em qualquer ordem (1296 no 9x9)"""
+    blocks = list(permutations(range(box_size)))
+    orders = []
+    for block_order in blocks:
+        for inner in product(blocks, repeat=box_size):
+            orders.append([box_size*block + k for block in block_order for k in inner[block]])
+    return orders
+
+
+def random_line_order(rng: random.Random, box_size: int) -> List[int]:
+    if box_size <= 3:
+        orders = line_orders(box_size)
+        return orders[int(rng.random()*len(orders))]
+    blocks = list(range(box_size))
+    rng.shuffle(blocks)
+    order = []
+    for block in blocks:
+        inner = list(range(box_size*block, box_size*block + box_size))
+        rng.shuffle(inner)
+        order.extend(inner)
+    return order
+
+
+def random_transform(rng: random.Random, box_size: int = 3) -> Transform:
+    """Sorteia uma transformacao que preserva a validade: a ordem das linhas, a das
+    colunas, se a grade e transposta e a troca dos digitos (labels[v] substitui v;
+    labels[0] = 0)"""
+    rows = random_line_order(rng, box_size)
+    columns = random_line_order(rng, box_size)
+    transposed = rng.random() < 0.5
+    digits = list(range(1, box_size*box_size + 1))
+    rng.shuffle(digits)
+    return rows, columns, transposed, [0] + digits
+
+
+def cell_permutation(transform: Transform) -> List[int]:
+    """A celula k da grade transformada vem da celula perm[k] da original"""
+    rows, columns, transposed, _ = transform
+    n = len(rows)
+    if transposed:
+        return [n*rows[j] + columns[i] for i in range(n) for j in range(n)]
+    return [n*rows[i] + columns[j] for i in range(n) for j in range(n)]
+
+
+class GridSampler:
+    def __init__(self, box_size: int = 3, seed: Optional[int] = None, reseed: int = 1000):
+        self.box_size = box_size
+        self.size = box_size*box_size
+        self.reseed = reseed
+        self.rng = random.Random(seed)
+        self.count = 0
+        self._base = b''
+        self._transposed = b''
+        self._padding = bytes(256 - self.size - 1)
+
+    def _next_base(self) -> bytes:
+        if self.count % self.reseed == 0:
+            grid = random_full_grid(self.rng, self.box_size)
+            self._base = bytes(value for row in grid for value in row)
+            self._transposed = bytes(value for column in zip(*grid) for value in column)
+        self.count += 1
+        return self._base
+
+    def sample_bytes(self) -> bytes:
+        """Uma grade completa achatada, um byte por celula"""
+        n = self.size
+        source = self._next_base()
+        rows, columns, transposed, labels = random_transform(self.rng, self.box_size)
+        if transposed:
+            # transposta: a linha i e a coluna columns[i] da base, na ordem rows
+            source, rows, columns = self._transposed, columns, rows
+        relabeled = source.translate(bytes(labels) + self._padding)
+        pick = itemgetter(*columns)
+        return b''.join([bytes(pick(relabeled[n*row:n*row + n])) for row in rows])
+
+    def sample(self) -> Grid:
+        return to_grid(list(self.sample_bytes()))
+
+    def batches(self, count: int, batch_size: int = 4096, as_numpy: bool = False) -> Iterator[Any]:
+        """Gera count grades em lotes de ate batch_size: bytes com as grades achatadas
+        em sequencia ou, com as_numpy, arrays uint8 de forma (lote, n*n)"""
+        if as_numpy:
+            yield from self._numpy_batches(count, batch_size)
+            return
+        while count > 0:
+            size = min(batch_size, count)
+            yield b''.join([self.sample_bytes() for _ in range(size)])
+            count -= size
+
+    def _numpy_batches(self, count: int, batch_size: int) -> Iterator[Any]:
+        import numpy as np
+        n = self.size
+        generator = np.random.default_rng(self.rng.getrandbits(64))
+        while count > 0:
+            size = min(batch_size, count)
+            bases = np.frombuffer(b''.join([self._next_base() for _ in range(size)]), dtype=np.uint8)
+            perm, labels = numpy_transforms(generator, size, self.box_size)
+            grids = np.take_along_axis(bases.reshape(size, n*n), perm, axis=1)
+            yield np.take_along_axis(labels, grids.astype(np.intp), axis=1)
+            count -= size
+
+
+def numpy_transforms(generator: Any, count: int, box_size: int = 3) -> Tuple[Any, Any]:
+    """Versao NumPy de random_transform seguida de cell_permutation para count grades
+    de uma vez: retorna perm (count, n*n), com a celula de origem de cada celula, e
+    labels (count, n + 1) uint8, com labels[:, 0] = 0"""
+    import numpy as np
+    b, n = box_size, box_size*box_size
+    lines = []
+    for _ in range(2):
+        blocks = np.argsort(generator.random((count, b)), axis=1)
+        inner = np.argsort(generator.random((count, b, b)), axis=2)
+        lines.append((b*blocks[:, :, None] + inner).reshape(count, n))
+    rows, columns = lines
+    perm = n*rows[:, :, None] + columns[:, None, :]
+    transposed = n*rows[:, None, :] + columns[:, :, None]
+    flip = generator.random(count) < 0.5
+    perm = np.where(flip[:, None, None], transposed, perm).reshape(count, n*n)
+    labels = np.zeros((count, n + 1), dtype=np.uint8)
+    labels[:, 1:] = np.argsort(generator.random((count, n)), axis=1) + 1
+    return perm, labels
+
+
+def chi_square(counts: List[int]) -> float:
+    expected = sum(counts)/len(counts)
+    return sum((count - expected)**2 for count in counts)/expected
+
+
+def critical_value(df: int, z: float = 3.09) -> float:
+    """Valor critico do qui-quadrado (aproximacao de Wilson-Hilferty); z = 3.09
+    corresponde a p = 0.001"""
+    a = 2/(9*df)
+    return df*(1 - a + z*math.sqrt(a))**3
+
+
+def coverage(samples: int = 20000, seed: int = 0, box_size: int = 3,
+        as_numpy: bool = False) -> Dict[str, Tuple[float, float]]:
+    """Teste qui-quadrado das transformacoes: para onde vao a primeira celula e a do
+    centro, qual digito substitui o 1 e quantas vezes a grade e transposta devem ser
+    uniformes. Com as_numpy testa as transformacoes de numpy_transforms, as usadas
+    por batches(as_numpy=True). Retorna a estatistica e o valor critico de cada teste"""
+    n = box_size*box_size
+    center = (n*n)//2
+    tallies = {'first-cell': [0]*(n*n), 'center-cell': [0]*(n*n), 'digit-1': [0]*n, 'transpose': [0]*2}
+    if as_numpy:
+        import numpy as np
+        perms, labelings = numpy_transforms(np.random.default_rng(seed), samples, box_size)
+        transforms = zip(perms.tolist(), labelings.tolist())
+    else:
+        rng = random.Random(seed)
+        transforms = ((cell_permutation(transform), transform[3])
+                for transform in (random_transform(rng, box_size) for _ in range(samples)))
+    for perm, labels in transforms:
+        tallies['first-cell'][perm.index(0)] += 1
+        tallies['center-cell'][perm.index(center)] += 1
+        tallies['digit-1'][labels[1] - 1] += 1
+        # sem transposicao a celula (0, 1) fica na mesma linha que a (0, 0)
+        tallies['transpose'][int(perm.index(0)//n != perm.index(1)//n)] += 1
+    return {name: (chi_square(counts), critical_value(len(counts) - 1)) for name, counts in tallies.items()}
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+    from .sudoku import Sudoku
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    sampler = GridSampler(seed=1)
+    start = time.perf_counter()
+    for _ in range(count):
+        sampler.sample_bytes()
+    elapsed = time.perf_counter() - start
+    print(f'sample_bytes      {count/elapsed:10.0f} grades/s')
+
+    start = time.perf_counter()
+    for _ in range(200):
+        random_full_grid(sampler.rng)
+    print(f'random_full_grid  {200/(time.perf_counter() - start):10.0f} grades/s')
+
+    start = time.perf_counter()
+    for _ in sampler.batches(count):
+        pass
+    print(f'batches (bytes)   {count/(time.perf_counter() - start):10.0f} grades/s')
+    try:
+        start = time.perf_counter()
+        for batch in sampler.batches(count, as_numpy=True):
+            pass
+        print(f'batches (numpy)   {count/(time.perf_counter() - start):10.0f} grades/s')
+    except ImportError:
+        print('batches (numpy)   numpy nao instalado')
+
+    def check(grid: Any) -> None:
+        sudoku = Sudoku(list(grid))
+        assert not sudoku.has_error_cells() and not sudoku.has_empty_cells()
+
+    for data in sampler.batches(100):
+        for k in range(0, len(data), 81):
+            check(data[k:k + 81])
+    for _ in range(100):
+        check([value for row in sampler.sample() for value in row])
+    paths = [False]
+    try:
+        for batch in sampler.batches(100, batch_size=30, as_numpy=True):
+            for row in batch.tolist():
+                check(row)
+        paths.append(True)
+    except ImportError:
+        pass
+    for as_numpy in paths:
+        print('transformacoes', 'numpy' if as_numpy else 'python')
+        for name, (statistic, critical) in coverage(as_numpy=as_numpy).items():
+            print(f'  {name:<12} qui-quadrado {statistic:8.1f}  critico {critical:8.1f}  '
+                    f'{"ok" if statistic < critical else "FALHOU"}')
@@ -0,0 +1,318 @@
+from typing import List, Dict, Tuple, Optional, Sequence, Iterator, Any
+import random
+import math
+import time
+
+from .sudoku import Geometry, box_size_of, cage_allowed
+
+
+Grid = List[List[int]]
+Tables = Tuple[List[int], List[int], List[int], List[List[int]]]
+
+POPCOUNT = [bin(mask).count('1') for mask in range(1 << 10)]
+
+_tables: Dict[int, Tables] = {}
+
+
+def tables(box_size: int) -> Tables:
+    """Retorna a linha, coluna e caixa de cada celula de uma grade n x n achatada
+    e a lista de unidades (linhas, colunas e caixas)"""
+    if not box_size in _tables:
+        n = box_size*box_size
+        row = [k//n for k in range(n*n)]
+        column = [k%n for k in range(n*n)]
+        box = [box_size*(k//(n*box_size)) + (k%n)//box_size for k in range(n*n)]
+        units = ([[k for k in range(n*n) if row[k] == u] for u in range(n)]
+                + [[k for k in range(n*n) if column[k] == u] for u in range(n)]
+                + [[k for k in range(n*n) if box[k] == u] for u in range(n)])
+        _tables[box_size] = (row, column, box, units)
+    return _tables[box_size]
+
+
+class GridSearch:
+    """Backtracking com mascaras de bits por linha, coluna e caixa. Em cada no
+    escolhe a celula com menos possibilidades; se nenhuma for forcada procura um
+    valor que so cabe numa celula de alguma unidade (ou que nao cabe em nenhuma,
+    o que encerra o ramo). Restricoes de variantes (src.variants) sao verificadas
+    celula a celula apenas quando presentes"""
+    def __init__(self, grid: Grid, rng: Optional[random.Random] = None, constraints: Sequence = ()):
+        self.box_size = box_size_of(grid)
+        self.size = n = self.box_size*self.box_size
+        self.row_of, self.column_of, self.box_of, self.units = tables(self.box_size)
+        self.all_values = (1 << (n + 1)) - 2
+        self.values: List[int] = [value for row in grid for value in row]
+        self.rows: List[int] = [0]*n
+        self.columns: List[int] = [0]*n
+        self.boxes: List[int] = [0]*n
+        self.empty: List[int] = [k for k in range(n*n) if self.values[k] == 0]
+        self.rng = rng
+        self.valid = True
+        self.count = 0
+        self.limit = 0
+        self.solution: Optional[List[int]] = None
+        self.deadline: Optional[float] = None
+        self.timed_out = False
+        self._ticks = 0
+        self.masks: List[int] = [0]*(n*n)
+        self.extra: Optional[List[List[int]]] = None
+        if constraints:
+            self._add_constraints(constraints)
+
+        for k, value in enumerate(self.values):
+            if value > 0:
+                bit = 1 << value
+                i, j, b = self.row_of[k], self.column_of[k], self.box_of[k]
+                if value > n or (self.rows[i] | self.columns[j] | self.boxes[b]) & bit:
+                    self.valid = False
+                self.rows[i] |= bit
+                self.columns[j] |= bit
+                self.boxes[b] |= bit
+
+    def _add_constraints(self, constraints: Sequence) -> None:
+        n = self.size
+        geometry = Geometry(self.box_size, constraints)
+        self.extra = [[i*n + j for i, j in geometry.extra_peers[k//n][k%n]] for k in range(n*n)]
+        self.units = self.units + [[i*n + j for i, j in unit] for unit in geometry.extra_units]
+        self.cages = [([i*n + j for i, j in cells], combinations) for cells, combinations in geometry.cages]
+        self.cage_of = [geometry.cage_of[k//n][k%n] for k in range(n*n)]
+
+        for k, value in enumerate(self.values):
+            if value > 0 and not self._extra_mask(k) >> value & 1:
+                self.valid = False
+        for cells, combinations in self.cages:
+            placed = [self.values[k] for k in cells if self.values[k] > 0]
+            mask = sum(1 << value for value in placed)
+            if len(set(placed)) < len(placed) or not any(c & mask == mask for c in combinations):
+                self.valid = False
+
+    def _extra_mask(self, k: int) -> int:
+        """Mascara dos valores que as restricoes das variantes permitem na celula"""
+        values = self.values
+        blocked = 0
+        for p in self.extra[k]:
+            blocked |= 1 << values[p]
+        mask = self.all_values & ~blocked
+        if self.cage_of[k] >= 0:
+            cells, combinations = self.cages[self.cage_of[k]]
+            placed = 0
+            for p in cells:
+                if p != k:
+                    placed |= 1 << values[p]
+            mask &= cage_allowed(combinations, placed & ~1)
+        return mask
+
+    def run(self, limit: int = 0, deadline: Optional[float] = None) -> int:
+        """Conta as solucoes, parando ao atingir limit (0 para contar todas). No
+        instante deadline (de time.monotonic()) para e marca timed_out; a contagem fica
+        parcial. Para percorrer as solucoes use SolutionStream"""
+        self.count = 0
+        self.limit = limit
+        self.deadline = deadline
+        self.timed_out = False
+        self.solution = None
+        if self.valid:
+            self._search()
+        return self.count
+
+    def choose(self) -> Tuple[int, List[int]]:
+        """Celula da proxima decisao e os valores a tentar: (-1, []) quando a grade
+        esta completa e (celula, []) quando o ramo nao tem saida"""
+        values, rows, columns, boxes = self.values, self.rows, self.columns, self.boxes
+        row_of, column_of, box_of, all_values = self.row_of, self.column_of, self.box_of, self.all_values
+        masks, extra = self.masks, self.extra
+        best, best_mask, best_count = -1, 0, self.size + 1
+        for k in self.empty:
+            if values[k] == 0:
+                mask = all_values & ~(rows[row_of[k]] | columns[column_of[k]] | boxes[box_of[k]])
+                if extra is not None:
+                    mask &= self._extra_mask(k)
+                masks[k] = mask
+                count = POPCOUNT[mask] if mask < 1024 else bin(mask).count('1')
+                if count < best_count:
+                    best, best_mask, best_count = k, mask, count
+                    if count <= 1:
+                        break
+
+        if best < 0 or best_count == 0:
+            return best, []
+        if best_count > 1:
+            hidden_unit, hidden_bit = None, 0
+            for unit in self.units:
+                once = twice = placed = 0
+                for k in unit:
+                    if values[k] == 0:
+                        twice |= once & masks[k]
+                        once |= masks[k]
+                    else:
+                        placed |= 1 << values[k]
+                if once | placed != all_values:
+                    return best, []
+                hidden = once & ~twice
+                if hidden and hidden_unit is None:
+                    hidden_unit, hidden_bit = unit, hidden & -hidden
+            if hidden_unit is not None and best_count > 1:
+                for k in hidden_unit:
+                    if values[k] == 0 and masks[k] & hidden_bit:
+                        best, best_mask, best_count = k, hidden_bit, 1
+                        break
+
+        candidates = [value for value in range(1, self.size + 1) if best_mask >> value & 1]
+        if self.rng is not None:
+            self.rng.shuffle(candidates)
+        return best, candidates
+
+    def _search(self) -> bool:
+        """Retorna verdadeiro quando a busca deve parar"""
+        if self.deadline is not None:
+            self._ticks += 1
+            if self._ticks & 1023 == 0 and time.monotonic() >= self.deadline:
+                self.timed_out = True
+                return True
+        best, candidates = self.choose()
+        values = self.values
+        if best < 0:
+            self.count += 1
+            if self.solution is None:
+                self.solution = values.copy()
+            return self.limit > 0 and self.count >= self.limit
+
+        rows, columns, boxes = self.rows, self.columns, self.boxes
+        i, j, b = self.row_of[best], self.column_of[best], self.box_of[best]
+        for value in candidates:
+            bit = 1 << value
+            values[best] = value
+            rows[i] |= bit
+            columns[j] |= bit
+            boxes[b] |= bit
+            stop = self._search()
+            values[best] = 0
+            rows[i] ^= bit
+            columns[j] ^= bit
+            boxes[b] ^= bit
+            if stop:
+                return True
+        return False
+
+
+def to_grid(values: List[int]) -> Grid:
+    n = math.isqrt(len(values))
+    return [values[n*i:n*i + n] for i in range(n)]
+
+
+def count_solutions(grid: Grid, limit: int = 0, constraints: Sequence = (),
+        deadline: Optional[float] = None) -> int:
+    """Retorna o numero de solucoes do jogo, contando no maximo limit se limit > 0
+    (e so as achadas ate o instante deadline, se houver)"""
+    return GridSearch(grid, constraints=constraints).run(limit, deadline=deadline)
+
+
+def has_unique_solution(grid: Grid, constraints: Sequence = ()) -> bool:
+    return count_solutions(grid, 2, constraints) == 1
+
+
+def solve_grid(grid: Grid, constraints: Sequence = ()) -> Optional[Grid]:
+    """Retorna uma solucao do jogo ou None caso nao exista"""
+    search = GridSearch(grid, constraints=constraints)
+    search.run(1)
+    if search.solution is None:
+        return None
+    return to_grid(search.solution)
+
+
+class SolutionStream:
+    """Gera as solucoes do jogo uma a uma com a mesma busca do GridSearch, mas com a
+    pilha de decisoes explicita: a memoria nao depende de quantas solucoes existem.
+    cursor() retorna o ponto atual como um dict serializavel em JSON, e
+    SolutionStream.from_cursor continua dali (com as mesmas restricoes)"""
+    def __init__(self, grid: Grid, constraints: Sequence = (), rng: Optional[random.Random] = None):
+        self.search = GridSearch(grid, rng, constraints)
+        self.grid = [row.copy() for row in grid]
+        self.path: List[List[Any]] = []
+        self.started = False
+        self.done = not self.search.valid
+        self.count = 0
+
+    @classmethod
+    def from_cursor(cls, cursor: Dict[str, Any], constraints: Sequence = ()) -> 'SolutionStream':
+        stream = cls(cursor['grid'], constraints)
+        for k, position, candidates in cursor['path']:
+            stream._place(k, candidates[position])
+            stream.path.append([k, position, list(candidates)])
+        stream.started = cursor['started']
+        stream.done = cursor['done'] or stream.done
+        stream.count = cursor['count']
+        return stream
+
+    def cursor(self) -> Dict[str, Any]:
+        return {
+            'grid': [row.copy() for row in self.grid],
+            'path': [[k, position, list(candidates)] for k, position, candidates in self.path],
+            'started': self.started,
+            'done': self.done,
+            'count': self.count,
+        }
+
+    def _place(self, k: int, value: int) -> None:
+        search, bit = self.search, 1 << value
+        search.values[k] = value
+        search.rows[search.row_of[k]] |= bit
+        search.columns[search.column_of[k]] |= bit
+        search.boxes[search.box_of[k]] |= bit
+
+    def _unplace(self, k: int, value: int) -> None:
+        search, bit = self.search, 1 << value
+        search.values[k] = 0
+        search.rows[search.row_of[k]] ^= bit
+        search.columns[search.column_of[k]] ^= bit
+        search.boxes[search.box_of[k]] ^= bit
+
+    def __iter__(self) -> Iterator[Grid]:
+        return self
+
+    def __next__(self) -> Grid:
+        if self.done:
+            raise StopIteration
+        descend = not self.started
+        self.started = True
+        path = self.path
+        while True:
+            if descend:
+                best, candidates = self.search.choose()
+                if best < 0:
+                    self.count += 1
+                    return to_grid(self.search.values.copy())
+                if candidates:
+                    path.append([best, -1, candidates])
+            while path:
+                frame = path[-1]
+                k, position, candidates = frame
+                if position >= 0:
+                    self._unplace(k, candidates[position])
+                if position + 1 < len(candidates):
+                    frame[1] = position + 1
+                    self._place(k, candidates[position + 1])
+                    descend = True
+                    break
+                path.pop()
+            else:
+                self.done = True
+                raise StopIteration
+
+
+def iter_solutions(grid: Grid, constraints: Sequence = (), cursor: Optional[Dict[str, Any]] = None) -> SolutionStream:
+    """Solucoes do jogo sob demanda, na mesma ordem do GridSearch; com cursor,
+    continua de onde uma SolutionStream anterior parou"""
+    if cursor is None:
+        return SolutionStream(grid, constraints)
+    if cursor['grid'] != grid:
+        raise ValueError('Cursor belongs to another grid')
+    return SolutionStream.from_cursor(cursor, constraints)
+
+
+def random_full_grid(rng: Optional[random.Random] = None, box_size: int = 3,
+        constraints: Sequence = ()) -> Grid:
+    """Retorna uma grade completa aleatoria"""
+    n = box_size*box_size
+    search = GridSearch([[0]*n for _ in range(n)], rng or random.Random(), constraints)
+    search.run(1)
+    return to_grid(search.solution)
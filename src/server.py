@@ -0,0 +1,293 @@
+"""Servico HTTP com respostas JSON para resolver, contar, avaliar e gerar jogos,
+sem depender do pygame.
+
+    python -m src.server --port 8000 --workers 4 --queue-size 16 --timeout 10
+
+POST /solve     {"grid": [[...], ...]}            -> {"solution": [[...]], "status": "solved", "stats": {...}}
+POST /count     {"grid": ..., "limit": 1000}      -> {"count": n, "limit": 1000, "status": "complete"}
+POST /rate      {"grid": ...}                     -> {"difficulty": "medio", "score": 68, ...}
+POST /generate  {"difficulty": "facil", "seed": 1, "symmetry": "rotational", "minimal": false}
+                                                  -> {"grid": [[...]]}
+POST /hint      {"grid": ...}                     -> {"hint": {"technique": "singles", ...}}
+GET  /metrics
+
+O grid pode ter qualquer tamanho n x n com n quadrado perfeito (4, 9, 16, 25); um
+grid 9x9 tambem pode ser enviado como texto de 81 caracteres ('0' ou '.' para vazio).
+O /solve para um pouco antes do timeout do servico (ou depois de "max_steps" passos
+ou "max_backtracks" trocas de tentativa, quando enviados) e responde a grade parcial
+com status "timeout", "step-limit" ou "backtrack-limit". O /rate respeita o mesmo
+prazo (responde 504 se passar dele) e o /generate para de tentar e de remover
+pistas no prazo, respondendo o melhor jogo ate ali. O /count tambem para no prazo
+e responde a contagem parcial com status "timeout"; o "limit" deve ser um inteiro
+positivo e fica limitado a MAX_COUNT_LIMIT.
+"""
+from typing import List, Dict, Any, Callable, Optional
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import threading
+import time
+
+from .sudoku import SudokuSolver, NogoodCache, box_size_of
+from .search import Grid, GridSearch
+from .generator import rate, generate
+
+
+DEFAULT_COUNT_LIMIT = 1000
+MAX_COUNT_LIMIT = 10000
+# folga entre o prazo do /solve e o timeout do servico, para a resposta parcial chegar
+DEADLINE_MARGIN = 0.05
+
+# estados sem saida ja vistos por este worker em pedidos anteriores: pedidos
+# repetidos do mesmo jogo dificil nao refazem as tentativas que falharam (o
+# primeiro pedido nao ganha nada)
+_nogoods = NogoodCache()
+
+
+class ServiceBusy(Exception):
+    pass
+
+
+def parse_grid(data: Any) -> Grid:
+    """Converte um grid n x n de inteiros (n = 4, 9, 16, 25...) ou um texto de 81 caracteres"""
+    if isinstance(data, str):
+        data = data.replace('.', '0')
+        if len(data) != 81 or not data.isdigit():
+            raise ValueError('Expected 81 digits')
+        return [[int(data[9*i + j]) for j in range(9)] for i in range(9)]
+    if not isinstance(data, list) or any(not isinstance(row, list) for row in data):
+        raise ValueError('Expected a n x n grid')
+    box_size_of(data)
+    for row in data:
+        for value in row:
+            if not isinstance(value, int) or value < 0 or value > len(data):
+                raise ValueError(f"Invalid value: '{value}'")
+    return data
+
+
+def _optional_int(payload: Dict[str, Any], key: str) -> Optional[int]:
+    value = payload.get(key)
+    if value is None:
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid {key}: '{value}'")
+
+
+def _positive_int(payload: Dict[str, Any], key: str, default: int) -> int:
+    value = payload.get(key, default)
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError(f"Invalid {key}: '{value}'")
+    return value
+
+
+def _solve(payload: Dict[str, Any]) -> Dict[str, Any]:
+    grid = parse_grid(payload.get('grid'))
+    solver = SudokuSolver(grid, nogoods=_nogoods)
+    outcome = solver.solve_within(payload.get('deadline'), _optional_int(payload, 'max_steps'),
+            _optional_int(payload, 'max_backtracks'))
+    if outcome['status'] == 'unsolvable':
+        raise ValueError('Sudoku has no solution')
+    return {'solution': outcome['values'], 'status': outcome['status'], 'stats': outcome['stats']}
+
+
+def _count(payload: Dict[str, Any]) -> Dict[str, Any]:
+    grid = parse_grid(payload.get('grid'))
+    limit = min(_positive_int(payload, 'limit', DEFAULT_COUNT_LIMIT), MAX_COUNT_LIMIT)
+    search = GridSearch(grid)
+    count = search.run(limit, deadline=payload.get('deadline'))
+    return {'count': count, 'limit': limit, 'status': 'timeout' if search.timed_out else 'complete'}
+
+
+def _rate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    return rate(parse_grid(payload.get('grid')), payload.get('deadline'))
+
+
+def _generate(payload: Dict[str, Any]) -> Dict[str, Any]:
+    minimal = payload.get('minimal', False)
+    if not isinstance(minimal, bool):
+        raise ValueError(f"Invalid minimal: '{minimal}'")
+    seed = payload.get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool)):
+        raise ValueError(f"Invalid seed: '{seed}'")
+    return {'grid': generate(payload.get('difficulty'), seed,
+            symmetry=payload.get('symmetry', 'none'), deadline=payload.get('deadline'), minimal=minimal)}
+
+
+def _hint(payload: Dict[str, Any]) -> Dict[str, Any]:
+    hint = SudokuSolver(parse_grid(payload.get('grid'))).next_hint()
+    if hint is not None:
+        hint['eliminations'] = [[index, sorted(values)] for index, values in hint['eliminations']]
+    return {'hint': hint}
+
+
+TASKS: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+    '/solve': _solve,
+    '/count': _count,
+    '/rate': _rate,
+    '/generate': _generate,
+    '/hint': _hint,
+}
+
+
+class Metrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[str, int] = {}
+        self.responses: Dict[str, int] = {}
+        self.latency_ms: Dict[str, Dict[str, float]] = {}
+        self.in_flight = 0
+
+    def start(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+
+    def finish(self, path: str, status: int, elapsed_ms: float) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self.requests[path] = self.requests.get(path, 0) + 1
+            self.responses[str(status)] = self.responses.get(str(status), 0) + 1
+            latency = self.latency_ms.setdefault(path, {'count': 0, 'total': 0.0, 'max': 0.0})
+            latency['count'] += 1
+            latency['total'] += elapsed_ms
+            latency['max'] = max(latency['max'], elapsed_ms)
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                'requests': dict(self.requests),
+                'responses': dict(self.responses),
+                'latency_ms': {path: dict(latency) for path, latency in self.latency_ms.items()},
+                'in_flight': self.in_flight,
+            }
+
+
+class SudokuService:
+    """Executa as tarefas num pool de processos limitado. Aceita no maximo
+    workers + queue_size tarefas pendentes; alem disso levanta ServiceBusy.
+    Cada tarefa recebe no payload o prazo ('deadline', de time.monotonic()) que o
+    /solve, o /count, o /rate e o /generate respeitam; o /hint nao resolve o jogo"""
+    def __init__(self, workers: int = 2, queue_size: int = 16, timeout: float = 10):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.timeout = timeout
+        self.metrics = Metrics()
+        self._pool = ProcessPoolExecutor(max_workers=workers)
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _) -> None:
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+
+    def run(self, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if not self._slots.acquire(blocking=False):
+            raise ServiceBusy()
+        with self._lock:
+            self._pending += 1
+        payload = dict(payload, deadline=time.monotonic() + self.timeout - DEADLINE_MARGIN)
+        future = self._pool.submit(TASKS[path], payload)
+        future.add_done_callback(self._release)
+        return future.result(timeout=self.timeout)
+
+    def metrics_dict(self) -> Dict[str, Any]:
+        metrics = self.metrics.to_dict()
+        with self._lock:
+            metrics['pending'] = self._pending
+        metrics['capacity'] = self.workers + self.queue_size
+        metrics['workers'] = self.workers
+        return metrics
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+class SudokuRequestHandler(BaseHTTPRequestHandler):
+    service: SudokuService
+
+    def send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+        return status
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            self.send_json(200, self.service.metrics_dict())
+        else:
+            self.send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        self.service.metrics.start()
+        status = self.handle_post()
+        self.service.metrics.finish(self.path, status, 1000*(time.perf_counter() - start))
+
+    def handle_post(self) -> int:
+        if not self.path in TASKS:
+            return self.send_json(404, {'error': 'Not found'})
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError('Expected a JSON object')
+            if 'grid' in payload:
+                payload['grid'] = parse_grid(payload['grid'])
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+
+        try:
+            return self.send_json(200, self.service.run(self.path, payload))
+        except ServiceBusy:
+            return self.send_json(503, {'error': 'Service busy'}, {'Retry-After': '1'})
+        except (FutureTimeoutError, TimeoutError):
+            return self.send_json(504, {'error': 'Timeout'})
+        except ValueError as e:
+            return self.send_json(400, {'error': str(e)})
+        except Exception as e:
+            return self.send_json(500, {'error': repr(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8000, workers: int = 2,
+        queue_size: int = 16, timeout: float = 10) -> ThreadingHTTPServer:
+    service = SudokuService(workers, queue_size, timeout)
+    handler = type('Handler', (SudokuRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.service = service
+    return server
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description='Sudoku JSON service')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--queue-size', type=int, default=16)
+    parser.add_argument('--timeout', type=float, default=10)
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, args.workers, args.queue_size, args.timeout)
+    print(f'Serving on http://{args.host}:{args.port}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.service.shutdown()
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
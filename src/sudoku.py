@@ -1,26 +1,262 @@
-from typing import Tuple, List, Set, Union, Dict, Optional
+from typing import (Tuple, List, Set, Union, Dict, Optional, Sequence, Iterator, AsyncIterator, Any,
+    Callable)
+from functools import lru_cache
+from collections import OrderedDict
 import random
+import math
+import time
 
 
 Index = Tuple[int, int]
 Change = Tuple[Index, int]
+Listener = Callable[[Optional[Index]], None]
+
+
+def cage_allowed(combinations: Tuple[int, ...], placed: int) -> int:
+    """Retorna a mascara dos valores que ainda completam alguma combinacao da gaiola
+    que contem os valores ja colocados"""
+    allowed = 0
+    for combination in combinations:
+        if combination & placed == placed:
+            allowed |= combination
+    return allowed & ~placed
+
+
+class Geometry:
+    """Tabelas de linhas, colunas, caixas e vizinhos de uma grade com caixas
+    box_size x box_size, calculadas uma unica vez por tamanho. As restricoes de
+    variantes (src.variants) acrescentam unidades, vizinhos e gaiolas"""
+    _cache: Dict[int, 'Geometry'] = {}
+
+    def __init__(self, box_size: int, constraints: Sequence = ()):
+        n = box_size*box_size
+        self.box_size = box_size
+        self.size = n
+        self.rows: List[List[Index]] = [[(i, j) for j in range(n)] for i in range(n)]
+        self.columns: List[List[Index]] = [[(i, j) for i in range(n)] for j in range(n)]
+        self.boxes: List[List[Index]] = [[(i, j)
+                for i in range(box_size*(b//box_size), box_size*(b//box_size) + box_size)
+                for j in range(box_size*(b%box_size), box_size*(b%box_size) + box_size)]
+                for b in range(n)]
+        self.box_of: List[List[int]] = [[box_size*(i//box_size) + j//box_size for j in range(n)]
+                for i in range(n)]
+        self.units: List[List[Index]] = []
+        for k in range(n):
+            self.units.append(self.rows[k])
+            self.units.append(self.columns[k])
+        self.units.extend(self.boxes)
+
+        self.has_extras = len(constraints) > 0
+        self.extra_units = [unit for constraint in constraints for unit in constraint.units(box_size)]
+        self.cages = [cage for constraint in constraints for cage in constraint.cages(box_size)]
+        self.cage_of: List[List[int]] = [[-1]*n for _ in range(n)]
+        for c, (cells, _) in enumerate(self.cages):
+            for i, j in cells:
+                self.cage_of[i][j] = c
+        extra: List[List[List[Index]]] = [[[] for _ in range(n)] for _ in range(n)]
+        groups = self.extra_units + [group for constraint in constraints
+                for group in constraint.groups(box_size)]
+        for group in groups:
+            for a in group:
+                extra[a[0]][a[1]].extend(b for b in group if b != a)
+        for a, b in (pair for constraint in constraints for pair in constraint.neighbors(box_size)):
+            extra[a[0]][a[1]].append(b)
+            extra[b[0]][b[1]].append(a)
+        self.extra_peers: List[List[List[Index]]] = [[list(dict.fromkeys(extra[i][j]))
+                for j in range(n)] for i in range(n)]
+        self.units.extend(self.extra_units)
+
+        self.peers: List[List[List[Index]]] = [[list(dict.fromkeys(
+                self.rows[i] + self.columns[j] + self.boxes[self.box_of[i][j]] + self.extra_peers[i][j]))
+                for j in range(n)] for i in range(n)]
+
+    @classmethod
+    def get(cls, box_size: int) -> 'Geometry':
+        if not box_size in cls._cache:
+            cls._cache[box_size] = Geometry(box_size)
+        return cls._cache[box_size]
+
+
+@lru_cache(maxsize=4096)
+def _values_in(mask: int) -> Tuple[int, ...]:
+    """Valores (bits acima do 0) presentes em uma mascara"""
+    return tuple(value for value in range(1, mask.bit_length()) if mask >> value & 1)
+
+
+@lru_cache(maxsize=None)
+def zobrist_keys(size: int) -> List[List[List[int]]]:
+    """Numeros aleatorios de 64 bits por celula e valor (o valor 0 vale 0), sempre os
+    mesmos para um tamanho, para que os hashes possam ser comparados entre jogos"""
+    rng = random.Random(size)
+    return [[[0] + [rng.getrandbits(64) for _ in range(size)] for _ in range(size)]
+            for _ in range(size)]
+
+
+def box_size_of(grid: Union[List[List[int]], Sequence[int]]) -> int:
+    """Retorna o tamanho da caixa de uma grade n x n, com n quadrado perfeito, ou
+    de uma lista plana com os n*n valores"""
+    if len(grid) > 0 and isinstance(grid[0], int):
+        n = math.isqrt(len(grid))
+        if n*n != len(grid):
+            raise ValueError('Expected n*n values with n a perfect square')
+        grid = [grid[n*i:n*i + n] for i in range(n)]
+    box_size = math.isqrt(len(grid))
+    if box_size < 1 or box_size*box_size != len(grid) or any(len(row) != len(grid) for row in grid):
+        raise ValueError('Expected a n x n grid with n a perfect square')
+    return box_size
 
 
 class Sudoku:
-    def __init__(self, initial_config: List[List[int]]):
-        self._values: List[List[int]] = [[0 for _ in range(9)] for _ in range(9)]
-        self._possibilities: List[List[Set[int]]] = [[set([i for i in range(1, 10)]) 
-                for _ in  range(9)] for _ in range(9)]
+    def __init__(self, initial_config: Union[List[List[int]], Sequence[int]],
+            box_size: Optional[int] = None, constraints: Sequence = ()):
+        if box_size is None:
+            box_size = box_size_of(initial_config)
+        self.constraints = tuple(constraints)
+        self._geometry = self._make_geometry(box_size)
+        self.box_size = box_size
+        self.size = box_size*box_size
         self.locked_indexes: Set[Index] = set()
-        self._error_cells: Set[Index] = set()
-        self._empty_cells = set([(i, j) for i in range(9) for j in range(9)])
         self._changes_history: List[Change] = []
+        self._listeners: List[Listener] = []
+        self._buckets: Optional[List[Set[Index]]] = None
+        self._hash: Optional[int] = None
+
+        self.load(initial_config)
+
+    @classmethod
+    def from_string(cls, text: str, constraints: Sequence = ()) -> 'Sudoku':
+        """Cria o jogo a partir de um texto com os n*n valores linha a linha ('0' ou '.'
+        para celula vazia, espacos e quebras de linha ignorados), como '53..7....6..195...'"""
+        values = []
+        for char in text:
+            if char.isdigit():
+                values.append(int(char))
+            elif char == '.':
+                values.append(0)
+            elif not char.isspace():
+                raise ValueError(f"Invalid character: '{char}'")
+        return cls(values, constraints=constraints)
+
+    def clear(self) -> None:
+        n = self.size
+        self._values: List[List[int]] = [[0 for _ in range(n)] for _ in range(n)]
+        self._possibilities: List[List[Set[int]]] = [[set(range(1, n + 1)) 
+                for _ in  range(n)] for _ in range(n)]
+        self._row_counts: List[List[int]] = [[0]*(n + 1) for _ in range(n)]
+        self._column_counts: List[List[int]] = [[0]*(n + 1) for _ in range(n)]
+        self._box_counts: List[List[int]] = [[0]*(n + 1) for _ in range(n)]
+        self.locked_indexes = set()
+        self._error_cells: Set[Index] = set()
+        self._empty_cells = set([(i, j) for i in range(n) for j in range(n)])
+        self._solution: Optional[List[List[int]]] = None
+        self._wrong_cells: Set[Index] = set()
+        for c in range(len(self._geometry.cages)):
+            self._restrict_cage(c)
+        if self._buckets is not None:
+            self.track_candidate_counts()
+        if self._hash is not None:
+            self.track_hash()
+        self._notify(None)
+
+    def add_listener(self, listener: Listener) -> None:
+        """Registra uma funcao chamada com o index de cada celula que muda de valor,
+        ou com None quando o jogo inteiro e recarregado"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: Listener) -> None:
+        self._listeners.remove(listener)
+
+    def _notify(self, index: Optional[Index]) -> None:
+        for listener in self._listeners:
+            listener(index)
+
+    def _make_geometry(self, box_size: int) -> Geometry:
+        if self.constraints:
+            return Geometry(box_size, self.constraints)
+        return Geometry.get(box_size)
+
+    def load(self, initial_config: Union[List[List[int]], Sequence[int]]) -> None:
+        """Carrega um jogo inteiro (grade n x n ou lista plana de n*n valores) de uma
+        so vez, travando as celulas preenchidas. Equivale a clear seguido de init, mas
+        calcula valores, possibilidades, erros e celulas vazias em uma unica passada
+        pelas mascaras de cada linha, coluna e caixa, sem repetir change_value por pista"""
+        n = self.size
+        if len(initial_config) > 0 and isinstance(initial_config[0], int):
+            flat = list(initial_config)
+        else:
+            flat = [value for row in initial_config for value in row]
+        if len(flat) != n*n:
+            raise ValueError(f'Expected {n*n} values')
+        geometry = self._geometry
+        if geometry.cages:
+            self.clear()
+            self.init([flat[n*i:n*i + n] for i in range(n)])
+            return
+
+        box_of = geometry.box_of
+        values = [[value if 0 < value <= n else 0 for value in flat[n*i:n*i + n]] for i in range(n)]
+        row_counts = [[0]*(n + 1) for _ in range(n)]
+        column_counts = [[0]*(n + 1) for _ in range(n)]
+        box_counts = [[0]*(n + 1) for _ in range(n)]
+        row_masks, column_masks, box_masks = [0]*n, [0]*n, [0]*n
+        locked = set((i, j) for i in range(n) for j in range(n) if values[i][j])
+        empty = set((i, j) for i in range(n) for j in range(n) if not values[i][j])
+        for i, j in locked:
+            value, b = values[i][j], box_of[i][j]
+            row_counts[i][value] += 1
+            column_counts[j][value] += 1
+            box_counts[b][value] += 1
+            bit = 1 << value
+            row_masks[i] |= bit
+            column_masks[j] |= bit
+            box_masks[b] |= bit
+
+        # os conjuntos partem de todos os valores e perdem os usados, como em clear e
+        # __set_value, para manter a mesma ordem de iteracao (e de pop) dos conjuntos
+        extra_peers = geometry.extra_peers if geometry.has_extras else None
+        full = set(range(1, n + 1))
+        possibilities: List[List[Set[int]]] = []
+        for i in range(n):
+            row_mask, boxes, line = row_masks[i], box_of[i], []
+            for j in range(n):
+                used = row_mask | column_masks[j] | box_masks[boxes[j]]
+                if extra_peers is not None:
+                    for a, b in extra_peers[i][j]:
+                        used |= 1 << values[a][b]
+                cell = full.copy()
+                if used:
+                    cell.difference_update(_values_in(used))
+                line.append(cell)
+            possibilities.append(line)
 
-        self.init(initial_config)
+        errors: Set[Index] = set()
+        for i, j in locked:
+            value = values[i][j]
+            if (row_counts[i][value] > 1 or column_counts[j][value] > 1
+                    or box_counts[box_of[i][j]][value] > 1 or (extra_peers is not None
+                    and any(values[a][b] == value for a, b in extra_peers[i][j]))):
+                errors.add((i, j))
+
+        self._values = values
+        self._possibilities = possibilities
+        self._row_counts = row_counts
+        self._column_counts = column_counts
+        self._box_counts = box_counts
+        self.locked_indexes = locked
+        self._error_cells = errors
+        self._empty_cells = empty
+        self._solution = None
+        self._wrong_cells = set()
+        self._changes_history = []
+        if self._buckets is not None:
+            self.track_candidate_counts()
+        if self._hash is not None:
+            self.track_hash()
+        self._notify(None)
 
     def init(self, initial_config: List[List[int]]) -> None:
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.size):
+            for j in range(self.size):
                 if initial_config[i][j] > 0:
                     self.change_value((i,j), initial_config[i][j])
                     self.locked_indexes.add((i, j))
@@ -28,23 +264,22 @@ class Sudoku:
         self._changes_history = []
 
     def reinit(self, initial_config: List[List[int]]) -> None:
-        self._values = [[0 for _ in range(9)] for _ in range(9)]
-        self._possibilities = [[set([i for i in range(1, 10)]) 
-                for _ in  range(9)] for _ in range(9)]
-        self.locked_indexes: Set[Index] = set()
-        self._error_cells: Set[Index] = set()
-        self._empty_cells = set([(i, j) for i in range(9) for j in range(9)])
-        self.init(initial_config)
+        box_size = box_size_of(initial_config)
+        if box_size != self.box_size:
+            self._geometry = self._make_geometry(box_size)
+            self.box_size = box_size
+            self.size = box_size*box_size
+        self.load(initial_config)
 
     def lock_nonzero_indexes(self) -> None:
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.size):
+            for j in range(self.size):
                 if self.get_value((i, j)) > 0:
                     self.locked_indexes.add((i, j))
 
     def clean_unloked_cells(self) -> None:
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.size):
+            for j in range(self.size):
                 if not (i,j) in self.locked_indexes:
                     self.change_value((i, j), 0)
 
@@ -60,11 +295,65 @@ class Sudoku:
 
     def add_possibility(self, index: Index, value: int) -> None:
         """Adiciona um valor ao conjunto de possibilidades de um determinado index"""
-        self._possibilities[index[0]][index[1]].add(value)
+        cell = self._possibilities[index[0]][index[1]]
+        if self._buckets is None or value in cell or self._values[index[0]][index[1]] != 0:
+            cell.add(value)
+        else:
+            self._buckets[len(cell)].discard(index)
+            cell.add(value)
+            self._buckets[len(cell)].add(index)
 
     def discard_possibility(self, index: Index, value: int) -> None:
         """Discarta um valor do conjunto de possibilidades de um determinado index"""
-        self._possibilities[index[0]][index[1]].discard(value)
+        cell = self._possibilities[index[0]][index[1]]
+        if self._buckets is None or not value in cell or self._values[index[0]][index[1]] != 0:
+            cell.discard(value)
+        else:
+            self._buckets[len(cell)].discard(index)
+            cell.discard(value)
+            self._buckets[len(cell)].add(index)
+
+    def track_candidate_counts(self) -> None:
+        """Passa a manter as celulas vazias em baldes pelo numero de possibilidades,
+        atualizados a cada possibilidade adicionada ou descartada"""
+        self._buckets = [set() for _ in range(self.size + 1)]
+        for i, j in self._empty_cells:
+            self._buckets[len(self._possibilities[i][j])].add((i, j))
+
+    def most_constrained_cells(self) -> Set[Index]:
+        """Celulas vazias com o menor numero de possibilidades, achadas sem percorrer a
+        grade quando track_candidate_counts esta ativo. O conjunto e compartilhado, nao altere"""
+        if self._buckets is None:
+            possibilities = self._possibilities
+            fewest = min((len(possibilities[i][j]) for i, j in self._empty_cells), default=0)
+            return set(index for index in self._empty_cells
+                    if len(possibilities[index[0]][index[1]]) == fewest)
+        for bucket in self._buckets:
+            if bucket:
+                return bucket
+        return set()
+
+    def track_hash(self) -> None:
+        """Passa a manter o hash de Zobrist dos valores, atualizado a cada valor
+        colocado ou limpo"""
+        self._hash = None
+        self._hash = self.zobrist_hash
+
+    @property
+    def zobrist_hash(self) -> int:
+        """Hash dos valores da grade: igual para grades com os mesmos valores"""
+        if self._hash is None:
+            keys = zobrist_keys(self.size)
+            result = 0
+            for i, line in enumerate(self._values):
+                for j, value in enumerate(line):
+                    result ^= keys[i][j][value]
+            return result
+        return self._hash
+
+    @property
+    def values(self) -> List[List[int]]:
+        return [line.copy() for line in self._values]
 
     @property
     def empty_cells(self) -> Set[Index]:
@@ -74,6 +363,33 @@ class Sudoku:
     def error_cells(self) -> Set[Index]:
         return self._error_cells.copy()
 
+    @property
+    def solution(self) -> Optional[List[List[int]]]:
+        return self._solution
+
+    @property
+    def wrong_cells(self) -> Set[Index]:
+        """Celulas preenchidas com valor diferente da solucao (vazio sem solucao)"""
+        return self._wrong_cells.copy()
+
+    def set_solution(self, solution: Optional[List[List[int]]]) -> None:
+        """Guarda a solucao do jogo; a partir dai cada mudanca de valor atualiza as
+        celulas erradas em O(1). None desliga a verificacao"""
+        self._solution = None if solution is None else [row.copy() for row in solution]
+        self._wrong_cells = set()
+        if solution is not None:
+            for i in range(self.size):
+                for j in range(self.size):
+                    if self._values[i][j] != 0 and self._values[i][j] != solution[i][j]:
+                        self._wrong_cells.add((i, j))
+
+    def is_wrong(self, index: Index) -> bool:
+        return index in self._wrong_cells
+
+    def is_solved(self) -> bool:
+        """Verdadeiro quando todas as celulas estao preenchidas sem conflitos"""
+        return not self._empty_cells and not self._error_cells
+
     def has_empty_cells(self) -> bool:
         return len(self._empty_cells) != 0
 
@@ -81,33 +397,40 @@ class Sudoku:
         return len(self._error_cells) != 0
 
     def has_no_possibilities_cell(self):
-        for index in self.empty_cells:
-            if not self.get_possibilities(index):
+        if self._buckets is not None:
+            return len(self._buckets[0]) > 0
+        possibilities = self._possibilities
+        for i, j in self._empty_cells:
+            if not possibilities[i][j]:
                 return True
         return False
 
+    @property
+    def units(self) -> List[List[Index]]:
+        """Linhas e colunas intercaladas, seguidas das caixas"""
+        return self._geometry.units
+
     def row(self, index: Index) -> List[Index]:
         """Retorna um vetor com as coordenadas da linha referente ao index"""
-        return [(index[0], k) for k in range(9)]
+        return self._geometry.rows[index[0]].copy()
     
     def column(self, index: Index) -> List[Index]:
         """Retorna um vetor com as coordenadas da coluna referente ao index"""
-        return [(k, index[1]) for k in range(9)]
+        return self._geometry.columns[index[1]].copy()
     
     def box(self, index: Index) -> List[Index]:
         """Retorna um vetor com as coordenadas da caixa referente ao index"""
-        i, j = index
-        box_start_i, box_start_j = 3*(i//3), 3*(j//3)
-        aux = []
-        for i in range(box_start_i, box_start_i + 3):
-            for j in range(box_start_j, box_start_j + 3):
-                aux.append((i,j))
-        return aux
+        return self._geometry.boxes[self._geometry.box_of[index[0]][index[1]]].copy()
 
     def row_column_box(self, index: Index) -> List[Index]:
         """Retorna um vetor com as coordenadas da linha, coluna e caixa referente ao index"""
         return self.row(index) + self.column(index) + self.box(index)
 
+    def peers(self, index: Index) -> List[Index]:
+        """Retorna as coordenadas da linha, coluna e caixa referente ao index sem
+        repeticoes (inclui o proprio index). A lista e compartilhada, nao altere"""
+        return self._geometry.peers[index[0]][index[1]]
+
     def has_value_in(self, value: int, list_to_check: List[Index]) -> bool:
         """Retorna verdadeiro se o valor está na lista"""
         for index in list_to_check:
@@ -117,19 +440,72 @@ class Sudoku:
 
     def in_row(self, index: Index, value: int) -> bool:
         """Retorna verdadeiro se o valor está na linha referente ao index"""
-        return self.has_value_in(value, self.row(index))
+        return self._row_counts[index[0]][value] > 0
     
     def in_column(self, index: Index, value: int) -> bool:
         """Retorna verdadeiro se o valor está na coluna referente ao index"""
-        return self.has_value_in(value, self.column(index))
+        return self._column_counts[index[1]][value] > 0
 
     def in_box(self, index: Index, value: int) -> bool:
         """Retorna verdadeiro se o valor está na caixa referente ao index"""
-        return self.has_value_in(value, self.box(index))
+        return self._box_counts[self._geometry.box_of[index[0]][index[1]]][value] > 0
 
     def in_row_column_box(self, index: Index, value: int) -> bool:
         """Retorna verdadeiro se o valor está na linha, coluna ou caixa referente ao index"""
-        return self.has_value_in(value, self.row_column_box(index))
+        i, j = index
+        return (self._row_counts[i][value] > 0 or self._column_counts[j][value] > 0 
+                or self._box_counts[self._geometry.box_of[i][j]][value] > 0)
+
+    def is_allowed(self, index: Index, value: int) -> bool:
+        """Retorna verdadeiro se nenhuma celula vizinha tem o valor e as regras das
+        variantes permitem o valor na celula"""
+        if self.in_row_column_box(index, value):
+            return False
+        if self._geometry.has_extras:
+            i, j = index
+            if self.has_value_in(value, self._geometry.extra_peers[i][j]):
+                return False
+            cage = self._geometry.cage_of[i][j]
+            if cage >= 0 and not self._cage_allowed(cage) >> value & 1:
+                return False
+        return True
+
+    def _cage_allowed(self, cage: int) -> int:
+        cells, combinations = self._geometry.cages[cage]
+        placed = 0
+        for i, j in cells:
+            placed |= 1 << self._values[i][j]
+        return cage_allowed(combinations, placed & ~1)
+
+    def _cage_accepts(self, index: Index, value: int) -> bool:
+        """Indica se value completa alguma combinacao da gaiola de index junto com os
+        valores das outras celulas da gaiola"""
+        cells, combinations = self._geometry.cages[self._geometry.cage_of[index[0]][index[1]]]
+        placed = 0
+        for i, j in cells:
+            if (i, j) != index:
+                placed |= 1 << self._values[i][j]
+        return cage_allowed(combinations, placed & ~1) >> value & 1 == 1
+
+    def _restrict_cage(self, cage: int) -> None:
+        """Descarta das celulas da gaiola os valores que nao completam nenhuma combinacao"""
+        allowed = self._cage_allowed(cage)
+        for i, j in self._geometry.cages[cage][0]:
+            for value in [value for value in self._possibilities[i][j] if not allowed >> value & 1]:
+                self.discard_possibility((i, j), value)
+
+    def _relax_cage(self, cage: int) -> None:
+        """Devolve as celulas da gaiola os valores que voltaram a ser permitidos"""
+        for index in self._geometry.cages[cage][0]:
+            for value in range(1, self.size + 1):
+                if self.is_allowed(index, value):
+                    self.add_possibility(index, value)
+
+    def _count_value(self, index: Index, value: int, delta: int) -> None:
+        i, j = index
+        self._row_counts[i][value] += delta
+        self._column_counts[j][value] += delta
+        self._box_counts[self._geometry.box_of[i][j]][value] += delta
     
     def __clean_value(self, index: Index) -> None:
         """Limpa o valor da celula e ajusta os valores possiveis da celula e das
@@ -137,32 +513,55 @@ class Sudoku:
         i, j = index
         previous = self.get_value(index)
         self._values[i][j] = 0
+        self._count_value(index, previous, -1)
+        if self._hash is not None:
+            self._hash ^= zobrist_keys(self.size)[i][j][previous]
 
-        for k in self.row_column_box(index):
-            if not self.in_row_column_box(k, previous):
-                self.add_possibility(k, previous)
+        if self._geometry.has_extras:
+            for k in self.peers(index):
+                if self.is_allowed(k, previous):
+                    self.add_possibility(k, previous)
+            if self._geometry.cage_of[i][j] >= 0:
+                self._relax_cage(self._geometry.cage_of[i][j])
+        else:
+            for k in self.peers(index):
+                if not self.in_row_column_box(k, previous):
+                    self.add_possibility(k, previous)
         
         self._empty_cells.add(index)
+        self._wrong_cells.discard(index)
+        if self._buckets is not None:
+            self._buckets[len(self._possibilities[i][j])].add(index)
 
     def __set_value(self, index: Index, value: int) -> None:
-        """Muda o valor da celula para um valor entre 1 e 9 e ajusta os valores possiveis
+        """Muda o valor da celula para um valor entre 1 e n e ajusta os valores possiveis
         das celulas da mesma linha, coluna ou caixa"""
         i,j = index
-        if not value in self.get_possibilities(index):
-            self._values[i][j] = value
-            self._error_cells.update(self.find(value, self.row_column_box(index)))
-        else:
-            self._values[i][j] = value
+        self._values[i][j] = value
+        self._count_value(index, value, 1)
+        if self._hash is not None:
+            self._hash ^= zobrist_keys(self.size)[i][j][value]
+        if self._buckets is not None:
+            self._buckets[len(self._possibilities[i][j])].discard(index)
+        if not value in self._possibilities[i][j]:
+            self._error_cells.update(self.find(value, self.peers(index)))
         
-        for i in self.row_column_box(index):
-            self.discard_possibility(i, value)
+        for k in self.peers(index):
+            self.discard_possibility(k, value)
+        if self._geometry.has_extras and self._geometry.cage_of[i][j] >= 0:
+            cage = self._geometry.cage_of[i][j]
+            self._restrict_cage(cage)
+            self._error_cells.update(k for k in self._geometry.cages[cage][0]
+                    if self.get_value(k) != 0 and not self._cage_accepts(k, self.get_value(k)))
 
         self._empty_cells.discard(index)
+        if self._solution is not None and self._solution[i][j] != value:
+            self._wrong_cells.add(index)
 
     def change_value(self, index: Index, value: int):
-        """Muda o valor de uma celula para um determinado valor entre 1 e 9 
+        """Muda o valor de uma celula para um determinado valor entre 1 e n 
         ou limpa a celula caso o valor seja 0"""
-        if (value >= 0) and (value < 10):
+        if (value >= 0) and (value <= self.size):
             if  self.get_value(index) != 0:
                 self._changes_history.append((index, self.get_value(index)))
                 self.__clean_value(index)
@@ -171,6 +570,8 @@ class Sudoku:
                 self._changes_history.append((index,0))
             if value > 0:
                 self.__set_value(index, value)
+            if self._listeners:
+                self._notify(index)
 
     def find(self, value: int, list_to_check: List[Index]) -> Set[Index]:
         """Retorna um conjunto com indices da lista que apresentam determinado valor"""
@@ -182,7 +583,12 @@ class Sudoku:
         for index in self._error_cells:
             value = self.get_value(index)
             if value != 0:
-                if len(self.find(value, self.row_column_box(index))) == 1:
+                i, j = index
+                if (self._row_counts[i][value] == 1 and self._column_counts[j][value] == 1
+                        and self._box_counts[self._geometry.box_of[i][j]][value] == 1
+                        and not (self._geometry.has_extras
+                        and (self.has_value_in(value, self._geometry.extra_peers[i][j])
+                        or (self._geometry.cage_of[i][j] >= 0 and not self._cage_accepts(index, value))))):
                     errors_to_discard.add(index)
             else:
                 errors_to_discard.add(index)
@@ -196,26 +602,86 @@ class Sudoku:
             self._changes_history.pop()
 
     def copy(self):
-        return Sudoku(self._values)
+        return Sudoku(self._values, self.box_size, self.constraints)
 
     def print_values(self):
         for line in self._values:
             print('  '.join(map(str, line)))
 
 
+class NogoodCache:
+    """Memoria entre resolucoes dos estados sem solucao (nogoods) achados pelas
+    tentativas do SudokuSolver, guardados pelo hash de Zobrist da grade inteira e
+    descartados do menos usado quando passam de capacity. Nao poda nada dentro de uma
+    unica busca: la um estado completo nunca se repete. So ajuda quando o cache e
+    compartilhado entre solvers de jogos do mesmo tamanho e variante, que desfazem na
+    hora os estados ja sabidos sem saida (o mesmo jogo pedido de novo ou retomado do
+    progresso do jogador); o primeiro pedido de um jogo dificil custa o mesmo"""
+    def __init__(self, capacity: int = 100_000):
+        self.capacity = capacity
+        self.hits = 0
+        self._states: 'OrderedDict[Tuple[Any, int], None]' = OrderedDict()
+
+    def add(self, key: Tuple[Any, int]) -> None:
+        self._states[key] = None
+        self._states.move_to_end(key)
+        if len(self._states) > self.capacity:
+            self._states.popitem(last=False)
+
+    def __contains__(self, key: Tuple[Any, int]) -> bool:
+        if key in self._states:
+            self._states.move_to_end(key)
+            self.hits += 1
+            return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._states)
+
+    def clear(self) -> None:
+        self._states.clear()
+        self.hits = 0
+
+
 class SudokuSolver:
-    def __init__(self, sudoku: Union[Sudoku, List[List[int]]]):
+    """Resolve com as tecnicas de celulas resolvidas, valores unicos e pares duplicados,
+    fazendo tentativas quando elas nao bastam. cell_order e value_order escolhem as
+    heuristicas das tentativas (src.branching); 'classic' mantem a escolha original,
+    que e a usada para avaliar a dificuldade dos jogos. Com um NogoodCache compartilhado,
+    os estados que falharam em resolucoes anteriores sao desfeitos na hora"""
+    def __init__(self, sudoku: Union[Sudoku, List[List[int]]], constraints: Sequence = (),
+            cell_order: str = 'classic', value_order: str = 'classic',
+            nogoods: Optional[NogoodCache] = None):
         self.sudoku: Sudoku
         if isinstance(sudoku, Sudoku):
             self.sudoku = sudoku
         else:
-            self.sudoku = Sudoku(sudoku)
+            self.sudoku = Sudoku(sudoku, constraints=constraints)
+        self.cell_order = cell_order
+        self.value_order = value_order
+        self._choose_cell: Optional[Callable[[Sudoku], Index]] = None
+        self._choose_value: Optional[Callable[[Sudoku, Index, Set[int]], int]] = None
+        if cell_order != 'classic' or value_order != 'classic':
+            from .branching import CELL_ORDERS, VALUE_ORDERS
+            if not cell_order in CELL_ORDERS or not value_order in VALUE_ORDERS:
+                raise ValueError(f"Invalid branching heuristic: '{cell_order}', '{value_order}'")
+            self._choose_cell = CELL_ORDERS[cell_order]
+            self._choose_value = VALUE_ORDERS[value_order]
+            if self._choose_cell is not None:
+                self.sudoku.track_candidate_counts()
+        self.nogoods = nogoods
+        self._signature: Tuple[Any, ...] = ()
+        if nogoods is not None:
+            geometry = self.sudoku._geometry
+            self._signature = (self.sudoku.size, repr(geometry.extra_peers), repr(geometry.cages))
+            self.sudoku.track_hash()
         self.attempts: List[Tuple[Index, Set[int]]] = []
         self.changes_to_make: List[Change] = []
         self.possibilities_to_discard: List[Tuple[Index, Set[int]]] = []
         self.double_pairs_indexes: List[Index] = []
         self.discarted_possibilities: List[Tuple[Index, Set[int]]] = []
         self.step = 0
+        self.unsolvable = False
 
     def reinit(self) -> None:
         self.attempts = []
@@ -224,13 +690,14 @@ class SudokuSolver:
         self.double_pairs_indexes = []
         self.discarted_possibilities = []
         self.step = 0
+        self.unsolvable = False
         self.sudoku.clean_unloked_cells()
 
     def check_solved_cells(self) -> List[Change]:
         """Retorna um vetor com os index e valores das celulas resolvidas"""
         aux = []
-        for i in range(9):
-            for j in range(9):
+        for i in range(self.sudoku.size):
+            for j in range(self.sudoku.size):
                 index = (i, j)
                 if self.sudoku.get_value(index) == 0:
                     cell = self.sudoku.get_possibilities(index)
@@ -239,9 +706,9 @@ class SudokuSolver:
         return aux
 
     def is_single(self, list_to_check: List[Index]) -> List[Change]:
-        """Retorna um vetor com os index e valores de cada valor entre 1 e 9 que aparece
+        """Retorna um vetor com os index e valores de cada valor entre 1 e n que aparece
         uma unica vez na lista de index"""
-        aux = [[] for _ in range(9)]
+        aux = [[] for _ in range(self.sudoku.size)]
         for index in list_to_check:
             if self.sudoku.get_value(index) == 0:
                 for k in self.sudoku.get_possibilities(index):
@@ -252,14 +719,8 @@ class SudokuSolver:
         """Retorna um vetor com os index e valores de cada valor unico em uma
         linha, coluna ou caixa"""
         aux = []
-        for i in range(9):
-            aux.extend(self.is_single(self.sudoku.row((i,0))))
-            aux.extend(self.is_single(self.sudoku.column((0,i))))
-        
-        for i in range(0, 9, 3):
-            for j in range(0, 9, 3):
-                aux.extend(self.is_single(self.sudoku.box((i,j))))
-        
+        for unit in self.sudoku.units:
+            aux.extend(self.is_single(unit))
         return aux
 
     def has_double_pairs(self, list_to_check: List[Index]) -> Tuple[List[Tuple[Index, Set[int]]], Set[Index]]:
@@ -300,22 +761,51 @@ class SudokuSolver:
         duplicados de todas as linhas, colunas, e caixas"""
         list_to_discard = []
         double_pair_indexes = set()
-        for i in range(9):
-            aux1, aux2 = self.has_double_pairs(self.sudoku.row((i,0)))
+        for unit in self.sudoku.units:
+            aux1, aux2 = self.has_double_pairs(unit)
             list_to_discard.extend(aux1)
             double_pair_indexes.update(aux2)
-            aux1, aux2 = self.has_double_pairs(self.sudoku.column((0,i)))
-            list_to_discard.extend(aux1)
-            double_pair_indexes.update(aux2)
-        
-        for i in range(0, 9, 3):
-            for j in range(0, 9, 3):
-                aux1, aux2 = self.has_double_pairs(self.sudoku.box((i,j)))
-                list_to_discard.extend(aux1)
-                double_pair_indexes.update(aux2)
         
         return list_to_discard, list(double_pair_indexes)
     
+    def next_hint(self, sudoku: Optional[Sudoku] = None) -> Optional[Dict[str, Any]]:
+        """Retorna a deducao mais barata disponivel sem alterar o jogo: as celulas com
+        erro, uma celula com uma unica possibilidade, um valor unico em uma linha, coluna
+        ou caixa, ou um par duplicado que descarta possibilidades. Usa as possibilidades
+        que o Sudoku ja mantem, sem resolver o jogo; retorna None quando so restam
+        tentativas ou o jogo esta completo"""
+        if sudoku is not None and sudoku is not self.sudoku:
+            return SudokuSolver(sudoku).next_hint()
+        sudoku = self.sudoku
+        if sudoku.has_error_cells():
+            return {'technique': 'errors', 'cells': sorted(sudoku.error_cells), 'value': None,
+                    'eliminations': []}
+
+        values, possibilities = sudoku._values, sudoku._possibilities
+        for i in range(sudoku.size):
+            for j in range(sudoku.size):
+                if values[i][j] == 0 and len(possibilities[i][j]) == 1:
+                    return {'technique': 'solved-cells', 'cells': [(i, j)],
+                            'value': next(iter(possibilities[i][j])), 'eliminations': []}
+
+        for unit in sudoku.units:
+            seen: Dict[int, Optional[Index]] = {}
+            for i, j in unit:
+                if values[i][j] == 0:
+                    for value in possibilities[i][j]:
+                        seen[value] = (i, j) if not value in seen else None
+            for value, index in seen.items():
+                if index is not None:
+                    return {'technique': 'singles', 'cells': [index], 'value': value,
+                            'eliminations': []}
+
+        for unit in sudoku.units:
+            eliminations, pair = self.has_double_pairs(unit)
+            if eliminations:
+                return {'technique': 'double-pairs', 'cells': sorted(pair), 'value': None,
+                        'eliminations': eliminations}
+        return None
+
     def make_changes(self, list_to_change: List[Change]) -> None:
         """Faz cada uma das mudanças de um vetor de mudanças"""
         for change in list_to_change:
@@ -330,40 +820,63 @@ class SudokuSolver:
     def fix_possibilities(self, list_to_fix: List[Tuple[Index, Set[int]]]) -> None:
         for index, possibilities in list_to_fix:
             for value in possibilities:
-                if not self.sudoku.in_row_column_box(index, value):
+                if self.sudoku.is_allowed(index, value):
                     self.sudoku.add_possibility(index, value)
 
     def make_attempt(self) -> List[Change]:
-        index = min(self.sudoku.empty_cells, key = lambda index: len(self.sudoku.get_possibilities(index)))
-        #index = self.sudoku.empty_cells.pop()
-        value = self.sudoku.get_possibilities(index).pop()
+        if self._choose_cell is None:
+            possibilities = self.sudoku._possibilities
+            index = min(self.sudoku.empty_cells, key = lambda index: len(possibilities[index[0]][index[1]]))
+        else:
+            index = self._choose_cell(self.sudoku)
+        value = self.pick_value(index, self.sudoku.get_possibilities(index))
         self.attempts.append((index, set([value])))
         return [(index, value)]
 
+    def pick_value(self, index: Index, candidates: Set[int]) -> int:
+        """Escolhe o valor a tentar entre os candidatos (o conjunto pode ser alterado)"""
+        if self._choose_value is None:
+            return candidates.pop()
+        return self._choose_value(self.sudoku, index, candidates)
+
     def change_attempt(self) -> List[Change]:
                
         while len(self.attempts) > 0:
             last_attempt_index, last_attempt_set = self.attempts[-1]
+            failed = self.sudoku.get_value(last_attempt_index)
             
             while self.sudoku.get_value(last_attempt_index) != 0:
                 self.sudoku.undo()
             self.fix_possibilities(self.discarted_possibilities)
             self.discarted_possibilities = []
+            if self.nogoods is not None and failed:
+                i, j = last_attempt_index
+                failed_hash = self.sudoku.zobrist_hash ^ zobrist_keys(self.sudoku.size)[i][j][failed]
+                self.nogoods.add((self._signature, failed_hash))
             
             possibilities = self.sudoku.get_possibilities(last_attempt_index).difference(last_attempt_set)
             if len(possibilities) > 0:
-                new_value = possibilities.pop()
+                new_value = self.pick_value(last_attempt_index, possibilities)
                 self.attempts[-1][1].add(new_value)
                 return [(last_attempt_index, new_value)]
             else:
+                if self.nogoods is not None:
+                    self.nogoods.add((self._signature, self.sudoku.zobrist_hash))
                 self.attempts.pop()
 
         return []
 
+    def is_known_dead(self) -> bool:
+        """Indica se o estado atual ja foi visto sem saida pelo NogoodCache"""
+        return self.nogoods is not None and (self._signature, self.sudoku.zobrist_hash) in self.nogoods
+
+    def has_conflict(self) -> bool:
+        return self.sudoku.has_error_cells() or self.sudoku.has_no_possibilities_cell()
+
     def step_solve(self) -> None:
-        if self.sudoku.has_error_cells() or self.sudoku.has_no_possibilities_cell():
-            print('problema')
+        if self.has_conflict() or (self.attempts and self.is_known_dead()):
             self.changes_to_make = self.change_attempt()
+            self.unsolvable = not self.attempts
             self.possibilities_to_discard = []
             self.step = 0
         elif self.changes_to_make:
@@ -390,7 +903,7 @@ class SudokuSolver:
                 self.changes_to_make = self.make_attempt() 
             self.step += 1
 
-    def solve(self) -> Dict[str, int]:
+    def new_stats(self) -> Dict[str, int]:
         stats = {
             "clues": len(self.sudoku.locked_indexes),
             "steps": 0,
@@ -400,13 +913,26 @@ class SudokuSolver:
             "attempts": 0,
             "attempt-change": 0,
         }
+        if self.nogoods is not None:
+            stats["nogood-hits"] = 0
+        return stats
+
+    def solve_steps(self, stats: Dict[str, int]) -> Iterator[Dict[str, int]]:
+        """Resolve o sudoku um passo por vez, gerando as estatisticas apos cada passo"""
         step = 0
         while self.sudoku.has_empty_cells() or self.sudoku.has_error_cells():
             stats['steps'] += 1
             if self.attempts:
-                if self.sudoku.has_error_cells() or self.sudoku.has_no_possibilities_cell():
+                if self.has_conflict():
+                    self.changes_to_make = self.change_attempt()
+                    stats['attempt-change'] += 1
+                elif self.is_known_dead():
                     self.changes_to_make = self.change_attempt()
                     stats['attempt-change'] += 1
+                    stats['nogood-hits'] += 1
+                if not self.attempts:
+                    self.unsolvable = True
+                    return
             if self.changes_to_make:
                 self.make_changes(self.changes_to_make)
                 self.changes_to_make = []
@@ -426,11 +952,68 @@ class SudokuSolver:
                 elif step == 2:
                     self.possibilities_to_discard,_ = self.check_double_pairs()
                     stats['double-pairs'] += len(self.possibilities_to_discard)
+                elif not self.attempts and self.has_conflict():
+                    self.unsolvable = True
+                    return
                 else:
                     self.changes_to_make = self.make_attempt()
                     stats['attempts'] += 1
                 step += 1
-        
+            yield stats
+
+    def solve(self) -> Dict[str, int]:
+        stats = self.new_stats()
+        for _ in self.solve_steps(stats):
+            pass
+        return stats
+
+    def solve_within(self, deadline: Optional[float] = None, max_steps: Optional[int] = None,
+            max_backtracks: Optional[int] = None) -> Dict[str, Any]:
+        """Como solve, mas para no instante deadline (de time.monotonic()), depois de
+        max_steps passos ou de max_backtracks trocas de tentativa. Retorna o status
+        ('solved', 'unsolvable', 'timeout', 'step-limit' ou 'backtrack-limit'), os
+        valores da grade no ponto em que parou e as estatisticas"""
+        stats = self.new_stats()
+        status = 'solved'
+        for _ in self.solve_steps(stats):
+            if deadline is not None and time.monotonic() >= deadline:
+                status = 'timeout'
+            elif max_steps is not None and stats['steps'] >= max_steps:
+                status = 'step-limit'
+            elif max_backtracks is not None and stats['attempt-change'] >= max_backtracks:
+                status = 'backtrack-limit'
+            else:
+                continue
+            break
+        if self.unsolvable:
+            status = 'unsolvable'
+        elif not self.sudoku.has_empty_cells() and not self.sudoku.has_error_cells():
+            status = 'solved'
+        return {'status': status, 'values': self.sudoku.values, 'stats': stats}
+
+    async def solve_steps_async(self, stats: Optional[Dict[str, int]] = None, yield_every: int = 1,
+            timeout: Optional[float] = None) -> AsyncIterator[Dict[str, int]]:
+        """Versao assincrona de solve_steps que devolve o controle ao event loop a cada
+        yield_every passos. Pode ser cancelada e levanta asyncio.TimeoutError quando
+        timeout (em segundos) e excedido; o prazo e verificado a cada devolucao"""
+        import asyncio
+        if yield_every < 1:
+            raise ValueError(f"Invalid yield_every: '{yield_every}'")
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        if stats is None:
+            stats = self.new_stats()
+        for n, _ in enumerate(self.solve_steps(stats), 1):
+            yield stats
+            if n % yield_every == 0:
+                await asyncio.sleep(0)
+                if deadline is not None and loop.time() > deadline:
+                    raise asyncio.TimeoutError()
+
+    async def solve_async(self, yield_every: int = 100, timeout: Optional[float] = None) -> Dict[str, int]:
+        stats = self.new_stats()
+        async for _ in self.solve_steps_async(stats, yield_every, timeout):
+            pass
         return stats
 
 
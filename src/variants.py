@@ -0,0 +1,101 @@
+"""Restricoes extras para variantes do sudoku.
+
+Uma restricao pode acrescentar:
+    units      grupos de n celulas que contem todos os valores (usados pelas tecnicas
+               do solver, como possibilidade unica)
+    groups     grupos menores de celulas com valores distintos
+    neighbors  pares de celulas que nao podem ter o mesmo valor
+    cages      grupos cuja soma e fixa, com a tabela de combinacoes possiveis
+
+    sudoku = Sudoku(grid, constraints=[Diagonal(), KillerCage([(0, 0), (0, 1)], 3)])
+"""
+from typing import List, Tuple, Dict, Type
+from functools import lru_cache
+from itertools import combinations
+
+from .sudoku import Index
+
+
+Cage = Tuple[List[Index], Tuple[int, ...]]
+
+
+@lru_cache(maxsize=None)
+def cage_combinations(cells: int, total: int, size: int) -> Tuple[int, ...]:
+    """Mascaras de bits de cada conjunto de cells valores distintos entre 1 e size
+    que somam total"""
+    return tuple(sum(1 << value for value in values)
+            for values in combinations(range(1, size + 1), cells) if sum(values) == total)
+
+
+class Constraint:
+    def units(self, box_size: int) -> List[List[Index]]:
+        return []
+
+    def groups(self, box_size: int) -> List[List[Index]]:
+        return []
+
+    def neighbors(self, box_size: int) -> List[Tuple[Index, Index]]:
+        return []
+
+    def cages(self, box_size: int) -> List[Cage]:
+        return []
+
+
+class Diagonal(Constraint):
+    """As duas diagonais principais contem todos os valores"""
+    def units(self, box_size: int) -> List[List[Index]]:
+        n = box_size*box_size
+        return [[(k, k) for k in range(n)], [(k, n - 1 - k) for k in range(n)]]
+
+
+class Windoku(Constraint):
+    """Caixas extras separadas por uma linha e uma coluna (4 caixas no 9x9)"""
+    def units(self, box_size: int) -> List[List[Index]]:
+        starts = [1 + t*(box_size + 1) for t in range(box_size - 1)]
+        return [[(i, j) for i in range(si, si + box_size) for j in range(sj, sj + box_size)]
+                for si in starts for sj in starts]
+
+
+class _Moves(Constraint):
+    moves: List[Tuple[int, int]] = []
+
+    def neighbors(self, box_size: int) -> List[Tuple[Index, Index]]:
+        n = box_size*box_size
+        pairs = []
+        for i in range(n):
+            for j in range(n):
+                for di, dj in self.moves:
+                    if 0 <= i + di < n and 0 <= j + dj < n and (i, j) < (i + di, j + dj):
+                        pairs.append(((i, j), (i + di, j + dj)))
+        return pairs
+
+
+class AntiKnight(_Moves):
+    """Celulas a um movimento de cavalo nao podem ter o mesmo valor"""
+    moves = [(1, 2), (2, 1), (1, -2), (2, -1), (-1, 2), (-2, 1), (-1, -2), (-2, -1)]
+
+
+class AntiKing(_Moves):
+    """Celulas vizinhas na diagonal nao podem ter o mesmo valor"""
+    moves = [(1, 1), (1, -1), (-1, 1), (-1, -1)]
+
+
+class KillerCage(Constraint):
+    """Celulas com valores distintos cuja soma deve ser total"""
+    def __init__(self, cells: List[Index], total: int):
+        self.cells = list(cells)
+        self.total = total
+
+    def groups(self, box_size: int) -> List[List[Index]]:
+        return [self.cells]
+
+    def cages(self, box_size: int) -> List[Cage]:
+        return [(self.cells, cage_combinations(len(self.cells), self.total, box_size*box_size))]
+
+
+VARIANTS: Dict[str, Type[Constraint]] = {
+    'diagonal': Diagonal,
+    'windoku': Windoku,
+    'anti-knight': AntiKnight,
+    'anti-king': AntiKing,
+}